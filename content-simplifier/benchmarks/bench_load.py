@@ -0,0 +1,300 @@
+"""Multi-session load test for the Streamlit app.
+
+Drives many simulated sessions of src/app.py at once, each an AppTest running
+in its own thread against the local fake backend, as one app process would
+serve concurrent instructors. Every session replays a seeded mix of
+interactions: simplifying single content, submitting a manual batch job,
+paging and scoring its history, and plain reruns such as the job poll.
+For each session count it reports rerun latency percentiles per interaction,
+reruns per second across all sessions and the resident memory the process
+grew by per session, then the most sessions whose rerun p95 stayed within
+budget. The memory figure includes each AppTest's copy of the rendered page,
+so it is an upper bound for a real session; later levels reuse memory freed
+by earlier ones, so measure a single level per run for sizing.
+
+Usage:
+    python benchmarks/bench_load.py
+    python benchmarks/bench_load.py --sessions 1 4 16 32 --actions 30 --latency 0.2
+    python benchmarks/bench_load.py --sessions 16 --mix single:1 history:1
+"""
+import argparse
+import gc
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+SRC_DIR = Path(__file__).parent.parent / 'src'
+sys.path.insert(0, str(SRC_DIR))
+
+from metrics import percentile  # noqa: E402
+
+# Relative weights of the interactions each session replays
+DEFAULT_MIX = ['single:4', 'batch:1', 'history:2', 'rerun:3']
+SUBJECTS = ['biology', 'physics', 'chemistry', 'mathematics', 'history']
+# concurrent_app_tests patches AppTest internals last checked against this release
+TESTED_STREAMLIT = '1.65'
+
+
+def rss_bytes():
+    """Resident memory of this process, or its peak where the current value is unavailable"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+@contextmanager
+def concurrent_app_tests():
+    """Let AppTest runs overlap across threads, as script runs do in a real server.
+
+    Each AppTest run installs a mock Runtime singleton and clears it when it
+    finishes, which breaks any run still going on another thread, and turns
+    test mode on by patching the global config for just its own run, which
+    overlapping runs undo out of order. While this is active, a cleared
+    singleton falls back to the last one installed, test mode stays on for
+    every run, and runs share one compiled copy of the script like a server's
+    sessions do instead of each parsing it again.
+    """
+    import streamlit
+
+    try:
+        from streamlit.runtime import Runtime
+        from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+        from streamlit.testing.v1 import app_test, local_script_runner
+    except ImportError as e:
+        missing = str(e)
+    else:
+        missing = ", ".join(
+            name for name, found in (
+                ('Runtime.instance', 'instance' in Runtime.__dict__),
+                ('Runtime.exists', 'exists' in Runtime.__dict__),
+                ('Runtime._instance', hasattr(Runtime, '_instance')),
+                ('app_test.ScriptCache', hasattr(app_test, 'ScriptCache')),
+                ('app_test.patch_config_options', hasattr(app_test, 'patch_config_options')),
+                ('local_script_runner.ScriptCache', hasattr(local_script_runner, 'ScriptCache')),
+            ) if not found
+        )
+    if missing:
+        raise SystemExit(f"Streamlit {streamlit.__version__} lacks the AppTest internals this load test patches "
+                         f"({missing}); run it with streamlit=={TESTED_STREAMLIT}.*")
+
+    saved = Runtime.__dict__['instance'], Runtime.__dict__['exists'], app_test.patch_config_options
+    installed = []
+    script_cache = ScriptCache()
+
+    def instance(cls):
+        if cls._instance is not None:
+            installed[:] = [cls._instance]
+        elif not installed:
+            raise RuntimeError("Runtime hasn't been created!")
+        return cls._instance or installed[0]
+
+    def exists(cls):
+        return cls._instance is not None or bool(installed)
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+    app_test.patch_config_options = lambda overrides: nullcontext()
+    try:
+        with saved[2]({'global.appTest': True}):
+            yield
+    finally:
+        Runtime.instance, Runtime.exists, app_test.patch_config_options = saved
+        app_test.ScriptCache = local_script_runner.ScriptCache = ScriptCache
+
+
+def make_session(number, latency):
+    from streamlit.testing.v1 import AppTest
+
+    from backends import LocalBackend
+    from fake_watsonx import FakePromptTemplateManager
+
+    app = AppTest.from_file(str(SRC_DIR / 'app.py'), default_timeout=120)
+    app.session_state.is_configured = True
+    app.session_state.backend = LocalBackend(latency=latency, seed=number)
+    app.session_state.prompt_mgr = FakePromptTemplateManager()
+    app.session_state.prompt_template_id = 'load-template'
+    app.session_state.model_params = {'max_tokens': 300, 'temperature': 0.7, 'decoding_method': 'greedy'}
+    # A history owner per session, as each instructor signs in with their own API key
+    app.session_state.history_owner = f"load-session-{number}"
+    return app
+
+
+def widget(elements, label):
+    return next(element for element in elements if element.label == label)
+
+
+def simplify_single(app, rng, step):
+    subject = rng.choice(SUBJECTS)
+    widget(app.text_input, "Subject").input(subject)
+    # Fresh content every time, so the response cache does not answer for the backend
+    widget(app.text_area, "Content to Simplify").input(
+        f"Step {step}: the {subject} process of {rng.randint(0, 10 ** 9)} works through energy and structure."
+    )
+    widget(app.button, "🚀 Simplify Content").click()
+
+
+def submit_batch(app, rng, step, batch_items):
+    app.session_state.batch_items = [
+        {'level': rng.choice(['beginner', 'intermediate', 'advanced']), 'subject': rng.choice(SUBJECTS),
+         'content': f"Batch step {step} item {index}: {rng.randint(0, 10 ** 9)} cells divide."}
+        for index in range(batch_items)
+    ]
+    # Render the button for the new items, then click it
+    app.run()
+    widget(app.button, "🚀 Process Manual Batch").click()
+
+
+def browse_history(app, rng, step):
+    if any(button.label == "📏 Readability by Level" for button in app.button) and rng.random() < 0.5:
+        widget(app.button, "📏 Readability by Level").click()
+    elif any(box.label == "Rows per page" for box in app.selectbox):
+        widget(app.selectbox, "Rows per page").select(rng.choice([25, 50, 100]))
+
+
+def run_session(number, args, mix, timings, errors, start_gate):
+    rng = random.Random(args.seed * 1000 + number)
+    app = make_session(number, args.latency)
+    start_gate.wait()
+    app.run()
+    kinds, weights = zip(*mix)
+    for step in range(args.actions):
+        kind = rng.choices(kinds, weights)[0]
+        try:
+            if kind == 'single':
+                simplify_single(app, rng, step)
+            elif kind == 'batch':
+                submit_batch(app, rng, step, args.batch_items)
+            elif kind == 'history':
+                browse_history(app, rng, step)
+            started = time.perf_counter()
+            app.run()
+            timings.append((kind, time.perf_counter() - started))
+            if app.exception:
+                errors.append(f"session {number}, {kind}: {app.exception[0].value}")
+        except Exception as e:
+            errors.append(f"session {number}, {kind}: {type(e).__name__}: {e}")
+        time.sleep(args.think_time)
+    return app
+
+
+def wait_for_jobs(sessions, timeout=300):
+    """Let the batch jobs a level submitted finish, so they do not load the next level"""
+    from job_queue import ACTIVE_STATUSES, JobQueue
+
+    queue = JobQueue()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not any(job['status'] in ACTIVE_STATUSES
+                   for number in range(sessions) for job in queue.list_jobs(f"load-session-{number}")):
+            return
+        time.sleep(0.2)
+
+
+def run_level(sessions, args, mix):
+    """Run sessions concurrently, returning timings, errors, wall time and memory growth"""
+    timings = []
+    errors = []
+    apps = [None] * sessions
+    start_gate = threading.Barrier(sessions)
+
+    def target(number):
+        apps[number] = run_session(number, args, mix, timings, errors, start_gate)
+
+    threads = [threading.Thread(target=target, args=(number,), daemon=True) for number in range(sessions)]
+    gc.collect()
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    # Sessions are still alive here, so their state is part of the measurement
+    growth = max(0, rss_bytes() - rss_before)
+    return timings, errors, elapsed, growth
+
+
+def parse_mix(values):
+    mix = []
+    for value in values:
+        kind, _, weight = value.partition(':')
+        if kind not in ('single', 'batch', 'history', 'rerun'):
+            raise SystemExit(f"Unknown interaction '{kind}'; use single, batch, history or rerun")
+        mix.append((kind, float(weight or 1)))
+    return mix
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Streamlit app with concurrent simulated sessions")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 8, 16],
+                        help="Concurrent session counts to measure")
+    parser.add_argument("--actions", type=int, default=20, help="Interactions per session")
+    parser.add_argument("--mix", nargs="+", default=DEFAULT_MIX,
+                        help="Interaction weights as kind:weight (single, batch, history, rerun)")
+    parser.add_argument("--batch-items", type=int, default=10, help="Items in each submitted manual batch")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake generation latency in seconds")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pause between a session's interactions")
+    parser.add_argument("--p95-budget", type=float, default=1.0,
+                        help="Rerun p95 in seconds that counts as still serving sessions comfortably")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mix = parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory() as cache_dir, concurrent_app_tests():
+        # Keep the app's caches, history, job queue and job files out of the working tree
+        os.environ['RESPONSE_CACHE_PATH'] = os.path.join(cache_dir, 'responses.sqlite')
+        os.environ['HISTORY_DB_PATH'] = os.path.join(cache_dir, 'history.sqlite')
+        os.environ['JOB_QUEUE_PATH'] = os.path.join(cache_dir, 'job_queue.sqlite')
+        os.environ['SEMANTIC_CACHE_PATH'] = os.path.join(cache_dir, 'semantic_cache.sqlite')
+        os.environ['JOB_FILES_DIR'] = os.path.join(cache_dir, 'job_files')
+        os.environ['JOB_JOURNAL_DIR'] = os.path.join(cache_dir, 'job_journals')
+
+        # Warm up imports and the process-wide resources so the first level is not charged for them
+        warmup = make_session(-1, args.latency)
+        warmup.run()
+
+        header = (f"{'sessions':>8}{'reruns':>8}{'reruns/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                  f"{'MB/session':>12}   p95 ms by interaction")
+        print(header)
+        print("-" * (len(header) + 30))
+        all_errors = []
+        capacity = 0
+        for sessions in args.sessions:
+            timings, errors, elapsed, growth = run_level(sessions, args, mix)
+            wait_for_jobs(sessions)
+            all_errors.extend(errors)
+            latencies = sorted(seconds for _, seconds in timings)
+            if percentile(latencies, 0.95, 0.0) <= args.p95_budget and not errors:
+                capacity = max(capacity, sessions)
+            by_kind = ", ".join(
+                f"{kind} {percentile(sorted(s for k, s in timings if k == kind), 0.95, 0.0) * 1000:.0f}"
+                for kind, _ in mix if any(k == kind for k, _ in timings)
+            )
+            print(f"{sessions:>8}{len(timings):>8}{len(timings) / elapsed:>10.1f}"
+                  f"{percentile(latencies, 0.5, 0.0) * 1000:>9.1f}{percentile(latencies, 0.95, 0.0) * 1000:>9.1f}"
+                  f"{percentile(latencies, 0.99, 0.0) * 1000:>9.1f}{growth / sessions / 1e6:>12.2f}   {by_kind}")
+
+    print(f"\nCapacity: {capacity} concurrent sessions with rerun p95 within {args.p95_budget * 1000:.0f} ms")
+    if all_errors:
+        print(f"\n❌ {len(all_errors)} interactions failed, first: {all_errors[0]}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""Throughput benchmarks for the simplification pipeline against a local fake backend.
+
+Runs the same code paths as the Single Content and Batch Processing tabs of
+src/app.py, with LocalBackend standing in for Watsonx.ai, and reports
+rows/sec, latency percentiles and peak Python memory for each input size and
+concurrency level.
+
+Usage:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --sizes 10 1000 100000 --concurrency 1 8 32 --latency 0.01
+    python benchmarks/bench_pipeline.py --throttle-rps 20 --requests-per-minute 1200
+    python benchmarks/bench_pipeline.py --block-sizes 8 32
+    python benchmarks/bench_pipeline.py --short-latency 0.005
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from backends import DEFAULT_SHORT_CONTENT_TOKENS, LocalBackend, RoutedBackend  # noqa: E402
+from batch_engine import iter_blocks, run_batch, split_concurrency  # noqa: E402
+from fake_watsonx import FakePromptTemplateManager  # noqa: E402
+from metrics import percentile  # noqa: E402
+from rate_limit import RateGovernor  # noqa: E402
+from template_cache import TemplateCache  # noqa: E402
+from watsonx_utils import build_generation_params, load_template_text, simplify_block, simplify_content  # noqa: E402
+
+LEVELS = ['beginner', 'intermediate', 'advanced']
+SUBJECTS = ['biology', 'physics', 'chemistry', 'mathematics', 'history']
+WORDS = ("energy cell force reaction equation molecule orbit theory process system light water "
+         "structure function balance motion element compound pressure signal").split()
+
+
+def make_rows(count, seed=0):
+    """Synthetic batch rows with varied content length"""
+    rng = random.Random(seed)
+    return [
+        {
+            'level': rng.choice(LEVELS),
+            'subject': rng.choice(SUBJECTS),
+            'content': " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 200)))
+        }
+        for _ in range(count)
+    ]
+
+
+def summarize(path, rows, concurrency, elapsed, latencies, errors, peak_bytes):
+    latencies = sorted(latencies)
+    return {
+        'path': path,
+        'rows': rows,
+        'concurrency': concurrency,
+        'rows_per_s': rows / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50, 0.0) * 1000,
+        'p95_ms': percentile(latencies, 0.95, 0.0) * 1000,
+        'p99_ms': percentile(latencies, 0.99, 0.0) * 1000,
+        'errors': errors,
+        'peak_mb': peak_bytes / 1e6
+    }
+
+
+def bench_single(backend, prompt_mgr, params, rows):
+    """Sequential requests, as issued by the Single Content tab"""
+    template_cache = TemplateCache()
+    latencies = []
+    errors = 0
+
+    for row in rows:
+        started = time.perf_counter()
+        try:
+            renderer = template_cache.get('bench', lambda asset_id: load_template_text(prompt_mgr, asset_id))
+            simplify_content(backend, renderer, row['level'], row['subject'], row['content'], params)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+
+    return latencies, errors
+
+
+def bench_batch(backend, prompt_mgr, params, rows, concurrency, governor=None):
+    """Concurrent worker pool, as used by the Batch Processing tab"""
+    renderer = TemplateCache().get('bench', lambda asset_id: load_template_text(prompt_mgr, asset_id))
+
+    def simplify_row(row):
+        started = time.perf_counter()
+        try:
+            simplify_content(backend, renderer, row['level'], row['subject'], row['content'], params,
+                             governor=governor)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    latencies = []
+    outcomes = run_batch(rows, simplify_row, max_workers=concurrency)
+    return latencies, sum(1 for outcome in outcomes if not outcome.ok)
+
+
+def bench_block(backend, prompt_mgr, params, rows, concurrency, block_size, governor=None):
+    """Multi-prompt generate_text calls of block_size rows, with the same total concurrency"""
+    renderer = TemplateCache().get('bench', lambda asset_id: load_template_text(prompt_mgr, asset_id))
+    blocks_in_flight, per_block = split_concurrency(concurrency, block_size)
+
+    def simplify_rows(block):
+        started = time.perf_counter()
+        try:
+            return simplify_block(backend, renderer, block, params, governor=governor, concurrency_limit=per_block)
+        finally:
+            # Every row of a block waits for the whole block
+            latencies.extend([time.perf_counter() - started] * len(block))
+
+    latencies = []
+    outcomes = iter_blocks(rows, simplify_rows, block_size, max_workers=blocks_in_flight)
+    return latencies, sum(1 for outcome in outcomes if not outcome.ok)
+
+
+def run_measured(func, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        latencies, errors = func(*args)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, latencies, errors, peak
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simplification pipeline offline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000], help="Batch sizes to run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16],
+                        help="Batch concurrency levels to run")
+    parser.add_argument("--block-sizes", type=int, nargs="*", default=[],
+                        help="Also run batches as multi-prompt requests of these sizes")
+    parser.add_argument("--single-requests", type=int, default=20,
+                        help="Number of sequential single-content requests")
+    parser.add_argument("--latency", type=float, default=0.02, help="Median fake generation latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Lognormal sigma applied to the latency")
+    parser.add_argument("--tokens-per-second", type=float, default=None,
+                        help="Fake output token throughput added to each call")
+    parser.add_argument("--short-latency", type=float, default=None,
+                        help="Route short content to a second fake model with this median latency")
+    parser.add_argument("--short-content-tokens", type=int, default=DEFAULT_SHORT_CONTENT_TOKENS,
+                        help="Content up to this many tokens is routed to the short content model")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake calls that fail")
+    parser.add_argument("--throttle-rps", type=float, default=None,
+                        help="Fake backend rejects calls above this rate with a 429")
+    parser.add_argument("--requests-per-minute", type=int, default=None,
+                        help="Put a RateGovernor with this request limit in front of batch generations")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="Also write results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def print_table(results):
+    header = f"{'path':<10}{'rows':>9}{'conc':>6}{'rows/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}" \
+             f"{'errors':>8}{'peak MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['path']:<10}{r['rows']:>9}{r['concurrency']:>6}{r['rows_per_s']:>10.1f}{r['p50_ms']:>9.1f}"
+              f"{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['errors']:>8}{r['peak_mb']:>9.2f}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    params = build_generation_params(300, 0.7, 'greedy')
+    prompt_mgr = FakePromptTemplateManager()
+
+    def make_backend():
+        options = {
+            'latency_jitter': args.jitter,
+            'tokens_per_second': args.tokens_per_second,
+            'error_rate': args.error_rate,
+            'seed': args.seed,
+            'max_requests_per_second': args.throttle_rps
+        }
+        backend = LocalBackend(latency=args.latency, **options)
+        if args.short_latency is None:
+            return backend
+        short = LocalBackend(model_id='local/fake-short', latency=args.short_latency, **options)
+        return RoutedBackend(backend, short, args.short_content_tokens)
+
+    def make_governor():
+        if args.requests_per_minute is None and args.throttle_rps is None:
+            return None
+        return RateGovernor(requests_per_minute=args.requests_per_minute, seed=args.seed)
+
+    results = []
+    rows = make_rows(args.single_requests, args.seed)
+    elapsed, latencies, errors, peak = run_measured(bench_single, make_backend(), prompt_mgr, params, rows)
+    results.append(summarize('single', len(rows), 1, elapsed, latencies, errors, peak))
+
+    for size in args.sizes:
+        rows = make_rows(size, args.seed)
+        for concurrency in args.concurrency:
+            elapsed, latencies, errors, peak = run_measured(
+                bench_batch, make_backend(), prompt_mgr, params, rows, concurrency, make_governor()
+            )
+            results.append(summarize('batch', size, concurrency, elapsed, latencies, errors, peak))
+
+            for block_size in args.block_sizes:
+                elapsed, latencies, errors, peak = run_measured(
+                    bench_block, make_backend(), prompt_mgr, params, rows, concurrency, block_size, make_governor()
+                )
+                results.append(summarize(f'block{block_size}', size, concurrency, elapsed, latencies, errors, peak))
+
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Interactive latency while batch jobs share the same rate governor.
+
+Issues Single Content style requests one after another, first on an idle
+governor and then while batch jobs from several owners keep it saturated,
+all against the local fake backend. Each loaded run is repeated with the
+jobs scheduled as batch work and with them treated like interactive calls,
+as before priority scheduling, and reports interactive p50/p95 latency and
+the rows/sec each owner's jobs got.
+
+Usage:
+    python benchmarks/bench_priority.py
+    python benchmarks/bench_priority.py --max-concurrency 8 --owners alice:24 bob:8 --batch-share 0.5
+"""
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from backends import LocalBackend  # noqa: E402
+from batch_engine import run_batch  # noqa: E402
+from fake_watsonx import FAKE_TEMPLATE  # noqa: E402
+from metrics import percentile  # noqa: E402
+from rate_limit import DEFAULT_BATCH_SHARE, RateGovernor  # noqa: E402
+from template_cache import PromptRenderer  # noqa: E402
+from watsonx_utils import simplify_content  # noqa: E402
+
+PARAMS = {'max_new_tokens': 300}
+
+
+def run_interactive(backend, renderer, governor, requests, think_time):
+    """Sequential requests with a pause between them, as one user clicking Simplify"""
+    latencies = []
+    for index in range(requests):
+        started = time.perf_counter()
+        simplify_content(backend, renderer, 'beginner', 'biology', f"Interactive request {index}.", PARAMS,
+                         governor=governor)
+        latencies.append(time.perf_counter() - started)
+        time.sleep(think_time)
+    return sorted(latencies)
+
+
+def run_scenario(args, owners, prioritized):
+    backend = LocalBackend(latency=args.latency, latency_jitter=args.jitter)
+    renderer = PromptRenderer(FAKE_TEMPLATE)
+    governor = RateGovernor(requests_per_minute=args.requests_per_minute, max_concurrency=args.max_concurrency,
+                            batch_share=args.batch_share, seed=0)
+    stop = threading.Event()
+    completed = {owner: 0 for owner, _ in owners}
+
+    def run_owner(owner, concurrency):
+        job_governor = governor.for_batch(owner) if prioritized else governor
+        counter = iter(range(10 ** 9))
+
+        def simplify_row(_):
+            if stop.is_set():
+                return
+            simplify_content(backend, renderer, 'advanced', 'physics', f"{owner} batch row {next(counter)}.",
+                             PARAMS, governor=job_governor)
+            completed[owner] += 1
+
+        while not stop.is_set():
+            run_batch(range(concurrency * 4), simplify_row, max_workers=concurrency)
+
+    threads = [threading.Thread(target=run_owner, args=owner, daemon=True) for owner in owners]
+    for thread in threads:
+        thread.start()
+    # Let the jobs fill the governor before measuring
+    time.sleep(args.warmup)
+    started = time.perf_counter()
+    latencies = run_interactive(backend, renderer, governor, args.requests, args.think_time)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, {owner: count / elapsed for owner, count in completed.items()}
+
+
+def parse_owners(values):
+    owners = []
+    for value in values:
+        name, _, concurrency = value.partition(':')
+        owners.append((name, int(concurrency or 16)))
+    return owners
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure interactive latency under batch load")
+    parser.add_argument("--requests", type=int, default=40, help="Interactive requests per run")
+    parser.add_argument("--think-time", type=float, default=0.02, help="Pause between interactive requests")
+    parser.add_argument("--owners", nargs="+", default=["alice:24", "bob:8"],
+                        help="Batch job owners as name:concurrency")
+    parser.add_argument("--latency", type=float, default=0.05, help="Median fake generation latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Lognormal sigma applied to the latency")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="Governor concurrency limit")
+    parser.add_argument("--requests-per-minute", type=int, default=None, help="Governor request rate limit")
+    parser.add_argument("--batch-share", type=float, default=DEFAULT_BATCH_SHARE,
+                        help="Share of the concurrency limit batch work may hold")
+    parser.add_argument("--warmup", type=float, default=0.5, help="Seconds the jobs run before measuring")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    owners = parse_owners(args.owners)
+
+    idle_governor = RateGovernor(requests_per_minute=args.requests_per_minute, max_concurrency=args.max_concurrency)
+    idle = run_interactive(LocalBackend(latency=args.latency, latency_jitter=args.jitter),
+                           PromptRenderer(FAKE_TEMPLATE), idle_governor, args.requests, args.think_time)
+    results = [('idle', idle, {})]
+    for label, prioritized in (('batch, no priority', False), ('batch, prioritized', True)):
+        latencies, rates = run_scenario(args, owners, prioritized)
+        results.append((label, latencies, rates))
+
+    header = f"{'scenario':<22}{'p50 ms':>9}{'p95 ms':>9}   batch rows/s by owner"
+    print(header)
+    print("-" * (len(header) + 10))
+    for label, latencies, rates in results:
+        by_owner = ", ".join(f"{owner} {rate:.0f}" for owner, rate in rates.items())
+        print(f"{label:<22}{percentile(latencies, 0.5, 0.0) * 1000:>9.1f}"
+              f"{percentile(latencies, 0.95, 0.0) * 1000:>9.1f}   {by_owner}")
+
+
+if __name__ == "__main__":
+    main()
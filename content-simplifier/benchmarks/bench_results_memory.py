@@ -0,0 +1,114 @@
+"""Memory held by batch results, per-row dicts versus the compact ResultsStore.
+
+Builds the results of a synthetic batch both ways and reports the Python
+memory each keeps alive once every row has finished, plus the peak while
+filling it in. The row dict layout is measured together with the DataFrame
+and CSV download built from it, as the Batch Processing tab used to keep on
+every rerun. The input rows are created before measuring, since both layouts
+share them.
+
+Usage:
+    python benchmarks/bench_results_memory.py
+    python benchmarks/bench_results_memory.py --rows 50000 --memory-limit-mb 8
+"""
+import argparse
+import gc
+import random
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+import pandas as pd  # noqa: E402
+
+from results_store import DEFAULT_MAX_MEMORY_MB, RESULT_COLUMNS, ResultsStore  # noqa: E402
+
+LEVELS = ['beginner', 'intermediate', 'advanced']
+SUBJECTS = ['biology', 'physics', 'chemistry', 'mathematics', 'history']
+WORDS = ("energy cell force reaction equation molecule orbit theory process system light water "
+         "structure function balance motion element compound pressure signal").split()
+
+
+def make_text(rng, min_words, max_words):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))) + "."
+
+
+def make_rows(count, seed=0):
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        'level': [rng.choice(LEVELS) for _ in range(count)],
+        'subject': [rng.choice(SUBJECTS) for _ in range(count)],
+        'content': [make_text(rng, 80, 200) for _ in range(count)]
+    })
+
+
+def respond(row_id, content):
+    # A fresh string per row, as a generation would return
+    return f"Simplified {row_id}: {content[:len(content) // 2]}"
+
+
+def build_row_dicts(df):
+    results = []
+    for row_id, row in df.iterrows():
+        results.append({
+            'level': row['level'],
+            'subject': row['subject'],
+            'original_content': row['content'],
+            'simplified_content': respond(row_id, row['content']),
+            'error': ''
+        })
+    results_df = pd.DataFrame(results, columns=RESULT_COLUMNS)
+    csv_data = results_df.to_csv(index=False).encode('utf-8')
+    return results, results_df, csv_data
+
+
+def build_store(df, memory_limit_mb):
+    contents = df['content'].tolist()
+    store = ResultsStore(df['level'], df['subject'], contents, max_memory_bytes=int(memory_limit_mb * 1024 * 1024))
+    for row_id in range(len(store)):
+        store.set(row_id, respond(row_id, contents[row_id]))
+    # Downloads are built when clicked, so nothing else is kept
+    return store
+
+
+def measure(build, *args):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = build(*args)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return kept, current, peak
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare memory held by batch result layouts")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--memory-limit-mb", type=float, default=DEFAULT_MAX_MEMORY_MB,
+                        help="ResultsStore outputs kept in memory before spilling to disk")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    df = make_rows(args.rows, args.seed)
+
+    _, dicts_current, dicts_peak = measure(build_row_dicts, df)
+    store, store_current, store_peak = measure(build_store, df, args.memory_limit_mb)
+    spilled = store.spilled
+    store.close()
+
+    print(f"{'layout':<16}{'rows':>9}{'kept MB':>10}{'peak MB':>10}")
+    print("-" * 45)
+    print(f"{'row dicts':<16}{args.rows:>9}{dicts_current / 1e6:>10.1f}{dicts_peak / 1e6:>10.1f}")
+    print(f"{'ResultsStore':<16}{args.rows:>9}{store_current / 1e6:>10.1f}{store_peak / 1e6:>10.1f}")
+    print(f"\n{spilled} of {args.rows} outputs spilled to disk; "
+          f"{dicts_current / max(store_current, 1):.1f}x less memory kept")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Startup and rerun time budget for the Streamlit app.
+
+Runs src/app.py headlessly with Streamlit's AppTest, first on the landing page
+and then configured against the local fake backend, and reports the first run
+and median rerun times. Exits with status 1 when any of them exceeds its
+budget, so it can gate deploys alongside bench_pipeline.py. Run it in a fresh
+interpreter: the first run includes importing everything app.py needs.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --cold-budget 1.5 --rerun-budget 0.3
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).parent.parent / 'src'
+sys.path.insert(0, str(SRC_DIR))
+
+# Modules the landing page should not need to import
+DEFERRED_MODULES = ['ibm_watsonx_ai', 'pandas']
+
+
+def make_app(configured):
+    from streamlit.testing.v1 import AppTest
+
+    from backends import LocalBackend
+    from fake_watsonx import FakePromptTemplateManager
+
+    app = AppTest.from_file(str(SRC_DIR / 'app.py'), default_timeout=60)
+    if configured:
+        app.session_state.is_configured = True
+        app.session_state.backend = LocalBackend()
+        app.session_state.prompt_mgr = FakePromptTemplateManager()
+        app.session_state.prompt_template_id = 'bench-template'
+        app.session_state.model_params = {'max_tokens': 300, 'temperature': 0.7, 'decoding_method': 'greedy'}
+    return app
+
+
+def time_runs(app, reruns):
+    """Seconds taken by the first run and the median of the following reruns"""
+    started = time.perf_counter()
+    app.run()
+    first = time.perf_counter() - started
+    if app.exception:
+        raise RuntimeError(f"app.py raised: {app.exception[0].value}")
+
+    timings = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - started)
+    return first, statistics.median(timings)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Check app startup and rerun times against a budget")
+    parser.add_argument("--reruns", type=int, default=10, help="Reruns timed after each first run")
+    parser.add_argument("--cold-budget", type=float, default=1.0,
+                        help="Maximum seconds for the first landing page run")
+    parser.add_argument("--configured-budget", type=float, default=2.0,
+                        help="Maximum seconds for the first run of the configured tabs")
+    parser.add_argument("--rerun-budget", type=float, default=0.3,
+                        help="Maximum median seconds for a rerun")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Keep the app's caches, history, job queue and job files out of the working tree
+        os.environ['RESPONSE_CACHE_PATH'] = os.path.join(cache_dir, 'responses.sqlite')
+        os.environ['HISTORY_DB_PATH'] = os.path.join(cache_dir, 'history.sqlite')
+        os.environ['JOB_QUEUE_PATH'] = os.path.join(cache_dir, 'job_queue.sqlite')
+        os.environ['SEMANTIC_CACHE_PATH'] = os.path.join(cache_dir, 'semantic_cache.sqlite')
+        os.environ['JOB_FILES_DIR'] = os.path.join(cache_dir, 'job_files')
+        os.environ['JOB_JOURNAL_DIR'] = os.path.join(cache_dir, 'job_journals')
+
+        # make_app imports AppTest, and with it Streamlit, before the clock starts,
+        # so the framework's own import is not part of the app's budget
+        cold, cold_rerun = time_runs(make_app(configured=False), args.reruns)
+        loaded = [name for name in DEFERRED_MODULES if name in sys.modules]
+        configured, configured_rerun = time_runs(make_app(configured=True), args.reruns)
+
+    checks = [
+        ('landing page, first run', cold, args.cold_budget),
+        ('landing page, rerun', cold_rerun, args.rerun_budget),
+        ('configured, first run', configured, args.configured_budget),
+        ('configured, rerun', configured_rerun, args.rerun_budget)
+    ]
+    failed = False
+    for name, seconds, budget in checks:
+        over = seconds > budget
+        failed = failed or over
+        status = '❌ over' if over else '✅'
+        print(f"{name:<26}{seconds * 1000:>9.1f} ms   budget {budget * 1000:>7.1f} ms   {status}")
+
+    if loaded:
+        failed = True
+        print(f"❌ Landing page imported {', '.join(loaded)}; keep these behind configuration")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
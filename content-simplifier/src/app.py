@@ -1,22 +1,42 @@
 import streamlit as st
-import pandas as pd
-from ibm_watsonx_ai import APIClient, Credentials
-from ibm_watsonx_ai.foundation_models import ModelInference
-from ibm_watsonx_ai.foundation_models.prompts import PromptTemplateManager
-from ibm_watsonx_ai.metanames import GenTextParamsMetaNames as GenParams
-from ibm_watsonx_ai.foundation_models.utils.enums import DecodingMethods, PromptTemplateFormats
 import time
+import datetime
 import json
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
+from streamlit.errors import StreamlitAPIException
+
+from backends import DEFAULT_SHORT_CONTENT_TOKENS, LocalBackend, RoutedBackend
+from batch_engine import DEFAULT_MAX_WORKERS, run_batch
+from chunking import DEFAULT_CHUNK_TOKENS, estimate_tokens, merge_output_tokens, simplify_long_content
+from dedup import DEFAULT_NEAR_THRESHOLD
+from fake_watsonx import FakePromptTemplateManager
+from history_store import HISTORY_COLUMNS, HistoryStore, make_owner_id
+from job_queue import ACTIVE_STATUSES, HEARTBEAT_SECONDS, REQUIRED_COLUMNS, JobQueue, JobWorkerPool
+from metrics import REGISTRY
+from rate_limit import RateGovernor
+from response_cache import ResponseCache
+from semantic_cache import SemanticCache
+from template_cache import DEFAULT_TEMPLATE_TTL, TemplateCache
+from watsonx_utils import (
+    build_generation_params,
+    get_shared_clients,
+    load_template_text,
+    simplify_content,
+    stream_simplified_content
+)
 
-# Load environment variables from .env file in parent directory
-env_path = Path(__file__).parent.parent / '.env'
-load_dotenv(dotenv_path=env_path)
+JOB_POLL_SECONDS = 2
+JOB_RESULTS_PAGE_ROWS = 25
 
-# Alternative: if you prefer to place .env in the same directory as app.py
-# load_dotenv()
+# .env file in parent directory
+env_path = Path(__file__).parent.parent / '.env'
+ENV_SETTINGS = ['IBM_API_KEY', 'IBM_PROJECT_ID', 'IBM_REGION', 'PROMPT_TEMPLATE_ASSET_ID', 'SHORT_MODEL_ID',
+                'SHORT_CONTENT_TOKENS', 'GENERATION_BACKEND']
+REGIONS = ["us-south", "eu-gb", "eu-de", "jp-tok"]
+LEVELS = ["beginner", "intermediate", "advanced"]
 
 # Page configuration
 st.set_page_config(
@@ -59,32 +79,131 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+
+@st.cache_resource(show_spinner=False)
+def get_env_defaults():
+    """Load .env and resolve the credential defaults once per process instead of on every rerun"""
+    # Alternative: if you prefer to place .env in the same directory as app.py, call load_dotenv()
+    load_dotenv(dotenv_path=env_path)
+    return {key: os.getenv(key, "") for key in ENV_SETTINGS}
+
+
+@st.cache_resource
+def get_template_cache():
+    """Prompt templates shared by all sessions in this process"""
+    return TemplateCache()
+
+
+@st.cache_resource
+def get_response_cache():
+    """Disk-backed generation cache shared by all sessions in this process"""
+    return ResponseCache()
+
+
+@st.cache_resource
+def get_semantic_cache():
+    """Similarity cache for reworded requests, shared by all sessions in this process"""
+    return SemanticCache()
+
+
+@st.cache_resource
+def get_history_store():
+    """Persistent simplification history shared by all sessions in this process"""
+    return HistoryStore()
+
+
+def get_history_owner():
+    """History is kept per API key, so it survives sessions without mixing users"""
+    return st.session_state.get('history_owner', 'local')
+
+
+@st.cache_resource
+def get_rate_governor():
+    """Rate limits and retries shared by every generation in this process"""
+    return RateGovernor.from_env()
+
+
+@st.cache_resource
+def get_job_queue():
+    """Background batch job queue shared by all sessions in this process"""
+    return JobQueue()
+
+
+@st.cache_resource
+def get_job_workers():
+    """Worker threads running queued batch jobs independently of any session"""
+    return JobWorkerPool(
+        get_job_queue(),
+        get_template_cache(),
+        response_cache=get_response_cache(),
+        governor=get_rate_governor(),
+        semantic_cache=get_semantic_cache()
+    ).start()
+
+
+@st.cache_data(ttl=DEFAULT_TEMPLATE_TTL, show_spinner=False)
+def list_templates(_prompt_mgr, owner):
+    """Saved prompt templates, fetched once per TTL instead of on every rerun"""
+    return _prompt_mgr.list()
+
+
+def lazy_download_button(label, make_data, **kwargs):
+    """Download button that only reads or builds its file when clicked.
+
+    Streamlit releases that do not accept a callable get the data up front.
+    """
+    try:
+        return st.download_button(label, data=make_data, **kwargs)
+    except (StreamlitAPIException, RuntimeError):
+        return st.download_button(label, data=make_data(), **kwargs)
+
+
+def discard_history_export():
+    """Forget this session's prepared history export and delete its file"""
+    export_path = st.session_state.pop('history_export_path', None)
+    if export_path:
+        try:
+            os.remove(export_path)
+        except FileNotFoundError:
+            pass
+
+
+def get_prompt_renderer():
+    """Return the cached renderer for the configured prompt template"""
+    prompt_mgr = st.session_state.prompt_mgr
+    return get_template_cache().get(
+        st.session_state.prompt_template_id,
+        lambda asset_id: load_template_text(prompt_mgr, asset_id)
+    )
+
+
 # Initialize session state
 if 'watsonx_client' not in st.session_state:
     st.session_state.watsonx_client = None
-if 'model_inference' not in st.session_state:
-    st.session_state.model_inference = None
+if 'backend' not in st.session_state:
+    st.session_state.backend = None
 if 'prompt_mgr' not in st.session_state:
     st.session_state.prompt_mgr = None
 if 'is_configured' not in st.session_state:
     st.session_state.is_configured = False
-if 'simplification_history' not in st.session_state:
-    st.session_state.simplification_history = []
+
+env_defaults = get_env_defaults()
+
+
+def env_status(key):
+    return "✅ Found" if env_defaults[key] else "❌ Missing"
+
 
 # Debug session state
-st.sidebar.markdown("**🔍 Debug Info:**")
-st.sidebar.write(f"is_configured: {st.session_state.is_configured}")
-env_status = "✅ Found" if os.getenv('IBM_API_KEY') else "❌ Missing"
-st.sidebar.write(f"API Key from env: {env_status}")
-env_status = "✅ Found" if os.getenv('IBM_PROJECT_ID') else "❌ Missing"
-st.sidebar.write(f"Project ID from env: {env_status}")
-env_status = "✅ Found" if os.getenv('PROMPT_TEMPLATE_ASSET_ID') else "❌ Missing"
-st.sidebar.write(f"Template ID from env: {env_status}")
-# Updated .env file check to look in the correct location
-env_file_exists = env_path.exists()
-st.sidebar.write(f".env file exists: {'✅ Yes' if env_file_exists else '❌ No'}")
-st.sidebar.write(f".env path: {env_path}")
-st.sidebar.markdown("---")
+with st.sidebar.expander("🔍 Debug Info"):
+    st.markdown(
+        f"- is_configured: {st.session_state.is_configured}\n"
+        f"- API Key from env: {env_status('IBM_API_KEY')}\n"
+        f"- Project ID from env: {env_status('IBM_PROJECT_ID')}\n"
+        f"- Template ID from env: {env_status('PROMPT_TEMPLATE_ASSET_ID')}\n"
+        f"- .env file exists: {'✅ Yes' if env_path.exists() else '❌ No'}\n"
+        f"- .env path: `{env_path}`"
+    )
 
 # Main header
 st.markdown('<h1 class="main-header">🎓 Content Simplification Lab</h1>', unsafe_allow_html=True)
@@ -98,20 +217,6 @@ with st.sidebar:
     st.subheader("Watsonx.ai Settings")
 
 
-    # Helper function to get env var if available
-    def get_env_default(key, default=""):
-        try:
-            value = os.getenv(key, default)
-            if value and value != default:
-                print(f"🔍 get_env_default({key}): Found value (first 20 chars): '{value[:20]}...'")
-            else:
-                print(f"🔍 get_env_default({key}): Using default/empty")
-            return value
-        except Exception as e:
-            print(f"❌ Error getting env var {key}: {e}")
-            return default
-
-
     st.markdown("""
     **Where to find these values:**
     - **API Key**: [IBM Cloud Console](https://cloud.ibm.com/iam/apikeys) → Create API Key  
@@ -120,20 +225,30 @@ with st.sidebar:
     """)
 
     api_key = st.text_input("API Key",
-                            value=get_env_default("IBM_API_KEY"),
+                            value=env_defaults["IBM_API_KEY"],
                             type="password",
                             help="Your IBM Cloud API key")
     project_id = st.text_input("Project ID",
-                               value=get_env_default("IBM_PROJECT_ID"),
+                               value=env_defaults["IBM_PROJECT_ID"],
                                help="Your Watsonx.ai project ID")
     region = st.selectbox("Region",
-                          options=["us-south", "eu-gb", "eu-de", "jp-tok"],
-                          index=0 if get_env_default("IBM_REGION") == "" else
-                          ["us-south", "eu-gb", "eu-de", "jp-tok"].index(get_env_default("IBM_REGION", "us-south")),
+                          options=REGIONS,
+                          index=REGIONS.index(env_defaults["IBM_REGION"]) if env_defaults["IBM_REGION"] else 0,
                           help="Select your IBM Cloud region")
     prompt_template_id = st.text_input("Prompt Template Asset ID",
-                                       value=get_env_default("PROMPT_TEMPLATE_ASSET_ID"),
+                                       value=env_defaults["PROMPT_TEMPLATE_ASSET_ID"],
                                        help="ID of your saved prompt template")
+    short_model_id = st.text_input("Short Content Model ID",
+                                   value=env_defaults["SHORT_MODEL_ID"],
+                                   help="Optional smaller, faster model for short content, e.g. "
+                                        "ibm/granite-3-2b-instruct. Leave empty to use the default model "
+                                        "for all content")
+    short_content_tokens = st.number_input("Short Content Limit (tokens)", 50, 4000,
+                                           int(env_defaults["SHORT_CONTENT_TOKENS"] or DEFAULT_SHORT_CONTENT_TOKENS),
+                                           50, disabled=not short_model_id,
+                                           help="Content up to this many tokens goes to the short content model")
+    # GENERATION_BACKEND=local connects to a deterministic offline stand-in, for demos and load tests
+    offline = env_defaults["GENERATION_BACKEND"] == "local"
 
     # Model settings
     st.subheader("Model Parameters")
@@ -142,44 +257,83 @@ with st.sidebar:
     decoding_method = st.selectbox("Decoding Method",
                                    options=["greedy", "sample"],
                                    help="Greedy for deterministic, Sample for creative")
+    stream_output = st.checkbox("Stream output", value=True,
+                                help="Show single-content output token by token as it is generated")
+
+    # Batch settings
+    st.subheader("Batch Settings")
+    batch_concurrency = st.slider("Concurrent Generations", 1, 16, DEFAULT_MAX_WORKERS,
+                                  help="Number of rows generated in parallel during batch processing")
+    batch_block_size = st.slider("Prompts per Request", 1, 32, 1,
+                                 help="Send batch rows to Watsonx.ai as multi-prompt requests of this many "
+                                      "prompts. 1 sends one prompt per request.")
+    merge_duplicates = st.checkbox("Merge duplicate rows", value=True,
+                                   help="Generate rows that differ only in case, whitespace or punctuation once")
+    detect_near_duplicates = st.checkbox("Detect near-duplicates", value=False,
+                                         help="Also merge rows with the same level and subject whose content "
+                                              "is highly similar")
+    near_duplicate_threshold = st.slider("Near-duplicate Similarity", 0.5, 1.0, DEFAULT_NEAR_THRESHOLD, 0.05,
+                                         disabled=not detect_near_duplicates)
+
+    # Long documents
+    st.subheader("Long Documents")
+    split_long_content = st.checkbox("Split long content", value=True,
+                                     help="Simplify long content in parallel chunks instead of one prompt")
+    chunk_tokens = st.slider("Chunk Size (tokens)", 200, 2000, DEFAULT_CHUNK_TOKENS, 100,
+                             help="Approximate input tokens per chunk")
+    merge_chunks = st.checkbox("Final merge pass", value=False,
+                               help="Run neighbouring simplified chunks through the model once more, a few at a "
+                                    "time, to smooth transitions")
+
+    # Response cache
+    st.subheader("Response Cache")
+    use_response_cache = st.checkbox("Reuse cached responses", value=True,
+                                     help="Greedy decoding is deterministic, so repeated requests are served "
+                                          "from a local cache. Sample decoding always calls the model.")
+    use_semantic_cache = st.checkbox("Reuse similar responses", value=False,
+                                     help="Also answer requests whose content closely matches an earlier one "
+                                          "for the same level and subject, even if worded differently")
+    semantic_stats_placeholder = st.empty()
+    # Filled in at the end of the run so counters include this run's requests
+    cache_stats_placeholder = st.empty()
+    if st.button("🗑️ Clear Response Cache"):
+        get_response_cache().clear()
+        get_semantic_cache().clear()
+        st.rerun()
 
     # Configuration button
     if st.button("🔧 Configure Watsonx.ai", type="primary"):
-        if api_key and project_id and prompt_template_id:
+        if offline or (api_key and project_id and prompt_template_id):
             try:
                 with st.spinner("Configuring Watsonx.ai connection..."):
-                    # Setup credentials
-                    url = f"https://{region}.ml.cloud.ibm.com"
-                    credentials = Credentials(api_key=api_key, url=url)
-
-                    # Initialize client
-                    client = APIClient(credentials)
-                    client.set.default_project(project_id)
-
-                    # Initialize model inference
-                    model_inference = ModelInference(
-                        model_id="ibm/granite-3-8b-instruct",
-                        credentials=credentials,
-                        project_id=project_id
-                    )
-
-                    # Initialize prompt manager
-                    prompt_mgr = PromptTemplateManager(
-                        credentials=credentials,
-                        project_id=project_id
-                    )
-
-                    # Test template loading
-                    test_template = prompt_mgr.load_prompt(
-                        prompt_id=prompt_template_id,
-                        astype=PromptTemplateFormats.STRING
+                    if offline:
+                        client, backend, prompt_mgr = None, LocalBackend(), FakePromptTemplateManager()
+                        if short_model_id:
+                            backend = RoutedBackend(backend, LocalBackend(model_id=short_model_id),
+                                                    short_content_tokens)
+                        prompt_template_id = prompt_template_id or 'local'
+                    else:
+                        # Clients are shared by every session using the same credentials,
+                        # so only the first one pays for authentication and connection setup
+                        client, backend, prompt_mgr = get_shared_clients(api_key, project_id, region,
+                                                                         short_model_id=short_model_id or None,
+                                                                         max_short_tokens=short_content_tokens)
+
+                    # Test template loading, always fetching a fresh copy
+                    get_template_cache().refresh(prompt_template_id)
+                    get_template_cache().get(
+                        prompt_template_id,
+                        lambda asset_id: load_template_text(prompt_mgr, asset_id)
                     )
 
                     # Store in session state
                     st.session_state.watsonx_client = client
-                    st.session_state.model_inference = model_inference
+                    st.session_state.backend = backend
                     st.session_state.prompt_mgr = prompt_mgr
                     st.session_state.prompt_template_id = prompt_template_id
+                    st.session_state.history_owner = make_owner_id(api_key)
+                    # Let background workers pick up this user's queued jobs again after a restart
+                    get_job_workers().register(st.session_state.history_owner, backend, prompt_mgr)
                     st.session_state.is_configured = True
                     st.session_state.model_params = {
                         'max_tokens': max_tokens,
@@ -211,9 +365,13 @@ with st.sidebar:
 
 # Main application
 if st.session_state.is_configured:
+    # pandas is only needed by the configured tabs, so the landing page starts without loading it
+    import pandas as pd
+    from readability import add_readability_columns
 
     # Tabs for different modes
-    tab1, tab2, tab3, tab4 = st.tabs(["📝 Single Content", "📚 Batch Processing", "📊 History", "🔧 Template Info"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📝 Single Content", "📚 Batch Processing", "📊 History",
+                                            "🔧 Template Info", "📈 Metrics"])
 
     with tab1:
         st.header("Single Content Simplification")
@@ -223,12 +381,18 @@ if st.session_state.is_configured:
         with col1:
             st.subheader("Input")
 
-            # Learning level
-            level = st.selectbox(
-                "Learning Level",
-                options=["beginner", "intermediate", "advanced"],
-                help="Select the target learning level"
-            )
+            # Learning level, or several levels generated from the same content at once
+            fan_out = st.checkbox("Generate several levels at once",
+                                  help="Simplify the content for each selected level concurrently")
+            if fan_out:
+                levels = st.multiselect("Learning Levels", options=LEVELS, default=LEVELS,
+                                        help="Select the target learning levels")
+            else:
+                levels = [st.selectbox(
+                    "Learning Level",
+                    options=LEVELS,
+                    help="Select the target learning level"
+                )]
 
             # Subject
             subject = st.text_input(
@@ -247,85 +411,151 @@ if st.session_state.is_configured:
 
             # Simplify button
             if st.button("🚀 Simplify Content", type="primary"):
-                if content and subject:
+                if content and subject and levels:
                     try:
                         with st.spinner("Simplifying content..."):
-                            # Load template
-                            prompt_text = st.session_state.prompt_mgr.load_prompt(
-                                prompt_id=st.session_state.prompt_template_id,
-                                astype=PromptTemplateFormats.STRING
-                            )
-
-                            # Fill variables
-                            variables = {
-                                "level": level,
-                                "subject": subject,
-                                "content": content
-                            }
-                            filled_prompt = prompt_text.format(**variables)
-
                             # Generate parameters
-                            params = {
-                                GenParams.MAX_NEW_TOKENS: st.session_state.model_params['max_tokens'],
-                                GenParams.TEMPERATURE: st.session_state.model_params['temperature']
-                            }
-
-                            if st.session_state.model_params['decoding_method'] == 'greedy':
-                                params[GenParams.DECODING_METHOD] = DecodingMethods.GREEDY
-                            else:
-                                params[GenParams.DECODING_METHOD] = DecodingMethods.SAMPLE
-
-                            # Generate response
-                            response = st.session_state.model_inference.generate_text(
-                                prompt=filled_prompt,
-                                params=params
+                            params = build_generation_params(
+                                st.session_state.model_params['max_tokens'],
+                                st.session_state.model_params['temperature'],
+                                st.session_state.model_params['decoding_method']
                             )
 
-                            # Store in history
-                            st.session_state.simplification_history.append({
-                                'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
-                                'level': level,
-                                'subject': subject,
-                                'original_content': content,
-                                'simplified_content': response
-                            })
+                            # Worker threads must not touch st.session_state, so capture what they need
+                            response_cache = get_response_cache() if use_response_cache else None
+                            semantic_cache = get_semantic_cache() if use_semantic_cache else None
+                            renderer = get_prompt_renderer()
+                            backend = st.session_state.backend
+                            governor = get_rate_governor()
+
+                            def simplify_level(level, on_text=None):
+                                """Generate one level, returning the response and its timings"""
+                                if split_long_content and estimate_tokens(content) > chunk_tokens:
+                                    def simplify_chunk(chunk):
+                                        return simplify_content(backend, renderer, level, subject, chunk,
+                                                                params, response_cache=response_cache,
+                                                                governor=governor, semantic_cache=semantic_cache)
+
+                                    def merge_window(window):
+                                        # Merges get an output budget sized to their input, so they never truncate
+                                        merge_params = dict(params, max_new_tokens=merge_output_tokens(window))
+                                        return simplify_content(backend, renderer, level, subject, window,
+                                                                merge_params, response_cache=response_cache,
+                                                                governor=governor)
+
+                                    started = time.perf_counter()
+                                    response, chunk_report = simplify_long_content(
+                                        content,
+                                        simplify_chunk,
+                                        max_tokens=chunk_tokens,
+                                        max_workers=batch_concurrency,
+                                        merge=merge_window if merge_chunks else None
+                                    )
+                                    return response, {'ttft_s': None, 'latency_s': time.perf_counter() - started,
+                                                      'chunks': chunk_report}
+                                if on_text is not None:
+                                    return stream_simplified_content(backend, renderer, level, subject,
+                                                                     content, params, response_cache=response_cache,
+                                                                     on_text=on_text, governor=governor,
+                                                                     semantic_cache=semantic_cache)
+                                started = time.perf_counter()
+                                response = simplify_content(backend, renderer, level, subject, content,
+                                                            params, response_cache=response_cache, governor=governor,
+                                                            semantic_cache=semantic_cache)
+                                return response, {'ttft_s': None, 'latency_s': time.perf_counter() - started}
 
-                            st.session_state.current_result = response
+                            # Generate response
+                            if len(levels) == 1 and stream_output:
+                                with col2:
+                                    stream_placeholder = st.empty()
+                                outcomes = [(levels[0],) + simplify_level(
+                                    levels[0],
+                                    on_text=lambda text: stream_placeholder.markdown(text + " ▌")
+                                )]
+                                stream_placeholder.empty()
+                            elif len(levels) == 1:
+                                outcomes = [(levels[0],) + simplify_level(levels[0])]
+                            else:
+                                # Every level is generated concurrently from the same content
+                                outcomes = []
+                                for outcome in run_batch(levels, simplify_level, max_workers=len(levels)):
+                                    if outcome.ok:
+                                        outcomes.append((outcome.row,) + outcome.result)
+                                    else:
+                                        st.error(f"❌ Error simplifying for {outcome.row}: {str(outcome.error)}")
+
+                            # Store in history, one record per level
+                            results = []
+                            for level, response, timings in outcomes:
+                                get_history_store().add(get_history_owner(), {
+                                    'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
+                                    'level': level,
+                                    'subject': subject,
+                                    'original_content': content,
+                                    'simplified_content': response,
+                                    'ttft_s': timings['ttft_s'],
+                                    'latency_s': timings['latency_s']
+                                })
+                                results.append({'level': level, 'subject': subject, 'response': response,
+                                                'timings': timings})
+
+                            if results:
+                                st.session_state.current_results = results
 
                     except Exception as e:
                         st.error(f"❌ Error: {str(e)}")
                 else:
-                    st.warning("⚠️ Please enter both subject and content")
+                    st.warning("⚠️ Please enter a subject, content and at least one level")
 
         with col2:
             st.subheader("Simplified Output")
 
-            if 'current_result' in st.session_state:
+            if st.session_state.get('current_results'):
                 st.markdown("### 📝 Simplified Content:")
 
-                # Show markdown formatting by default
-                st.markdown(st.session_state.current_result)
-
-                # Raw text view in expander
-                with st.expander("📄 View Raw Text"):
-                    st.text(st.session_state.current_result)
-
-                # Download buttons
-                col_download1, col_download2 = st.columns(2)
-                with col_download1:
-                    st.download_button(
-                        label="📥 Download as Markdown",
-                        data=st.session_state.current_result,
-                        file_name=f"simplified_{subject}_{level}.md",
-                        mime="text/markdown"
-                    )
-                with col_download2:
-                    st.download_button(
-                        label="📄 Download Raw Text",
-                        data=st.session_state.current_result,
-                        file_name=f"simplified_{subject}_{level}.txt",
-                        mime="text/plain"
-                    )
+                current_results = st.session_state.current_results
+                if len(current_results) > 1:
+                    result_containers = st.tabs([result['level'].title() for result in current_results])
+                else:
+                    result_containers = [st.container()]
+
+                for container, result in zip(result_containers, current_results):
+                    with container:
+                        timings = result['timings']
+                        first_token = ""
+                        if timings['ttft_s'] is not None:
+                            first_token = f"First token in {timings['ttft_s']:.2f}s · "
+                        st.caption(f"{first_token}Total {timings['latency_s']:.2f}s")
+                        if timings.get('chunks'):
+                            with st.expander("⏱️ Per-chunk latency"):
+                                st.dataframe(pd.DataFrame(timings['chunks']))
+
+                        # Show markdown formatting by default
+                        st.markdown(result['response'])
+
+                        # Raw text view in expander
+                        with st.expander("📄 View Raw Text"):
+                            st.text(result['response'])
+
+                        # Download buttons
+                        file_stem = f"simplified_{result['subject']}_{result['level']}"
+                        col_download1, col_download2 = st.columns(2)
+                        with col_download1:
+                            st.download_button(
+                                label="📥 Download as Markdown",
+                                data=result['response'],
+                                file_name=f"{file_stem}.md",
+                                mime="text/markdown",
+                                key=f"download_md_{result['level']}"
+                            )
+                        with col_download2:
+                            st.download_button(
+                                label="📄 Download Raw Text",
+                                data=result['response'],
+                                file_name=f"{file_stem}.txt",
+                                mime="text/plain",
+                                key=f"download_txt_{result['level']}"
+                            )
             else:
                 st.markdown("""
                 <div style='
@@ -346,6 +576,19 @@ if st.session_state.is_configured:
         st.header("Batch Processing")
 
         col1, col2 = st.columns([1, 1])
+        # Uploads and manual items go through the same job pipeline with the same settings
+        batch_job_settings = {
+            'template_id': st.session_state.prompt_template_id,
+            'max_tokens': st.session_state.model_params['max_tokens'],
+            'temperature': st.session_state.model_params['temperature'],
+            'decoding_method': 'greedy',
+            'concurrency': batch_concurrency,
+            'block_size': batch_block_size,
+            'use_cache': use_response_cache,
+            'use_semantic_cache': use_semantic_cache,
+            'merge_duplicates': merge_duplicates,
+            'near_threshold': near_duplicate_threshold if detect_near_duplicates else None
+        }
 
         with col1:
             st.subheader("Upload CSV or Enter Multiple Items")
@@ -355,58 +598,19 @@ if st.session_state.is_configured:
 
             if uploaded_file:
                 try:
-                    df = pd.read_csv(uploaded_file)
+                    # The whole file is only parsed by the job, so reruns just read enough for the preview
+                    df = pd.read_csv(uploaded_file, nrows=5)
                     st.write("Preview of uploaded data:")
                     st.dataframe(df.head())
 
-                    required_cols = ['level', 'subject', 'content']
-                    if all(col in df.columns for col in required_cols):
+                    if all(col in df.columns for col in REQUIRED_COLUMNS):
+                        # Jobs run on background workers, so they keep going if this tab closes or reruns
                         if st.button("🚀 Process Batch", type="primary"):
-                            batch_results = []
-                            progress_bar = st.progress(0)
-
-                            for i, row in df.iterrows():
-                                try:
-                                    # Load template
-                                    prompt_text = st.session_state.prompt_mgr.load_prompt(
-                                        prompt_id=st.session_state.prompt_template_id,
-                                        astype=PromptTemplateFormats.STRING
-                                    )
-
-                                    # Fill variables
-                                    variables = {
-                                        "level": row['level'],
-                                        "subject": row['subject'],
-                                        "content": row['content']
-                                    }
-                                    filled_prompt = prompt_text.format(**variables)
-
-                                    # Generate
-                                    params = {
-                                        GenParams.MAX_NEW_TOKENS: st.session_state.model_params['max_tokens'],
-                                        GenParams.TEMPERATURE: st.session_state.model_params['temperature'],
-                                        GenParams.DECODING_METHOD: DecodingMethods.GREEDY
-                                    }
-
-                                    response = st.session_state.model_inference.generate_text(
-                                        prompt=filled_prompt,
-                                        params=params
-                                    )
-
-                                    batch_results.append({
-                                        'level': row['level'],
-                                        'subject': row['subject'],
-                                        'original_content': row['content'],
-                                        'simplified_content': response
-                                    })
-
-                                    progress_bar.progress((i + 1) / len(df))
-
-                                except Exception as e:
-                                    st.error(f"Error processing row {i}: {str(e)}")
-
-                            st.session_state.batch_results = batch_results
-                            st.success(f"✅ Processed {len(batch_results)} items!")
+                            get_job_workers().register(get_history_owner(), st.session_state.backend,
+                                                       st.session_state.prompt_mgr)
+                            get_job_queue().submit(get_history_owner(), uploaded_file.getvalue(),
+                                                   batch_job_settings, name=uploaded_file.name)
+                            st.success("✅ Batch submitted! Follow its progress under Batch Jobs.")
                     else:
                         st.error("❌ CSV must contain columns: level, subject, content")
 
@@ -419,7 +623,7 @@ if st.session_state.is_configured:
                 st.session_state.batch_items = []
 
             with st.form("add_batch_item"):
-                level_batch = st.selectbox("Level", ["beginner", "intermediate", "advanced"])
+                level_batch = st.selectbox("Level", LEVELS)
                 subject_batch = st.text_input("Subject")
                 content_batch = st.text_area("Content", height=100)
 
@@ -434,63 +638,212 @@ if st.session_state.is_configured:
 
             if st.session_state.batch_items:
                 st.write(f"Items to process: {len(st.session_state.batch_items)}")
-                if st.button("🚀 Process Manual Batch"):
-                    # Similar processing logic as CSV
-                    st.success("Processing complete!")
+                col_process, col_clear = st.columns(2)
+                with col_process:
+                    if st.button("🚀 Process Manual Batch"):
+                        manual_items = st.session_state.batch_items
+                        get_job_workers().register(get_history_owner(), st.session_state.backend,
+                                                   st.session_state.prompt_mgr)
+                        get_job_queue().submit(
+                            get_history_owner(),
+                            pd.DataFrame(manual_items, columns=REQUIRED_COLUMNS).to_csv(index=False).encode('utf-8'),
+                            batch_job_settings,
+                            name=f"Manual batch ({len(manual_items)} items)"
+                        )
+                        st.session_state.batch_items = []
+                        st.success("✅ Batch submitted! Follow its progress under Batch Jobs.")
+                with col_clear:
+                    if st.button("🗑️ Clear Items"):
+                        st.session_state.batch_items = []
+                        st.rerun()
 
         with col2:
-            st.subheader("Batch Results")
-
-            if 'batch_results' in st.session_state and st.session_state.batch_results:
-                results_df = pd.DataFrame(st.session_state.batch_results)
-                st.dataframe(results_df)
+            st.subheader("Batch Jobs")
+
+            def render_batch_jobs():
+                jobs = get_job_queue().list_jobs(get_history_owner())
+                if not jobs:
+                    st.info("No batch jobs yet. Upload a CSV and click Process Batch to start one.")
+                    return
+
+                for job in jobs:
+                    submitted = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job['created_at']))
+                    st.markdown(f"**{job['name'] or job['id']}** · {job['status']} · submitted {submitted}")
+
+                    if job['status'] == 'queued':
+                        st.caption("⏳ Waiting for a worker")
+                    elif job['generations']:
+                        st.progress(min(1.0, job['processed'] / job['generations']))
+                        progress_note = (f"{job['processed']} of {job['generations']} generations · "
+                                         f"{job['resumed']} resumed · {job['failed']} failed")
+                        if job['status'] == 'running' and job['heartbeat_at']:
+                            # Workers send a heartbeat every HEARTBEAT_SECONDS even while rows are slow,
+                            # so a much older one means the worker has stopped
+                            silent = time.time() - job['heartbeat_at']
+                            if silent > 3 * HEARTBEAT_SECONDS:
+                                progress_note += f" · ⚠️ no word from its worker for {silent:.0f}s"
+                            else:
+                                progress_note += f" · worker checked in {silent:.0f}s ago"
+                        st.caption(progress_note)
+
+                    if job['status'] in ACTIVE_STATUSES:
+                        if st.button("✖️ Cancel", key=f"cancel_{job['id']}"):
+                            get_job_queue().cancel(job['id'], get_history_owner())
+                            st.rerun()
+                    elif job['status'] == 'failed':
+                        st.error(f"❌ {job['error']}")
+                    elif job['status'] == 'done':
+                        dedup = 1 - job['generations'] / job['total'] if job['total'] else 0.0
+                        st.caption(f"♻️ {job['total']} rows needed {job['generations']} generations "
+                                   f"(dedup ratio {dedup:.0%})")
+                        if job['failed']:
+                            st.warning(f"⚠️ {job['failed']} generations failed after retries. They are listed "
+                                       f"with their error in the results; submit the file again to retry them.")
+                        output_path = get_job_queue().output_path(job['id'])
+                        if output_path.exists():
+                            # Read on click, so polling does not load every finished job's results each run
+                            lazy_download_button(
+                                "📥 Download Results CSV",
+                                output_path.read_bytes,
+                                file_name=f"batch_simplification_results_{job['id']}.csv",
+                                mime="text/csv",
+                                key=f"download_{job['id']}"
+                            )
+                    st.markdown("---")
+
+                viewable_jobs = {job['id']: job for job in jobs if job['status'] in ('running', 'done')}
+                if viewable_jobs:
+                    st.subheader("Job Results")
+                    results_job_id = st.selectbox(
+                        "Job", list(viewable_jobs), key="results_job",
+                        format_func=lambda job_id: (f"{viewable_jobs[job_id]['name'] or job_id} "
+                                                    f"({viewable_jobs[job_id]['status']})")
+                    )
+                    render_job_results(viewable_jobs[results_job_id])
+
+            def job_results_csv(job_id, completed_only=False):
+                store = get_job_workers().live_results(job_id)
+                if store is not None:
+                    return store.to_csv_bytes(completed_only=completed_only)
+                return get_job_queue().output_path(job_id).read_bytes()
+
+            def render_job_results(job):
+                """One page of a job's finished rows, read from its worker while it runs"""
+                store = get_job_workers().live_results(job['id'])
+                output_path = get_job_queue().output_path(job['id'])
+                if store is not None:
+                    finished_rows = store.completed
+                elif output_path.exists():
+                    finished_rows = job['total'] or 0
+                else:
+                    st.caption("⏳ Rows appear here as this job's worker finishes them")
+                    return
+
+                page_count = max(1, -(-finished_rows // JOB_RESULTS_PAGE_ROWS))
+                page_number = min(page_count, st.number_input("Results page", min_value=1, value=1,
+                                                              key=f"results_page_{job['id']}"))
+                offset = (page_number - 1) * JOB_RESULTS_PAGE_ROWS
+                if store is not None:
+                    page_df = store.page(offset, JOB_RESULTS_PAGE_ROWS)
+                else:
+                    page_df = pd.read_csv(output_path, skiprows=range(1, offset + 1), nrows=JOB_RESULTS_PAGE_ROWS,
+                                          keep_default_na=False)
+                st.caption(f"Page {page_number} of {page_count} · "
+                           f"{finished_rows} of {job['total'] or 0} rows finished")
+                st.dataframe(page_df)
+
+                if store is not None and finished_rows:
+                    lazy_download_button(
+                        "📥 Download Partial Results",
+                        lambda: job_results_csv(job['id'], completed_only=True),
+                        file_name=f"batch_simplification_partial_{job['id']}.csv",
+                        mime="text/csv",
+                        key=f"partial_{job['id']}"
+                    )
 
-                # Download results
-                csv_data = results_df.to_csv(index=False)
-                st.download_button(
-                    label="📥 Download Results CSV",
-                    data=csv_data,
-                    file_name="batch_simplification_results.csv",
-                    mime="text/csv"
-                )
+            # Poll job status without rerunning the whole page, where st.fragment is available
+            if hasattr(st, 'fragment'):
+                st.fragment(run_every=JOB_POLL_SECONDS)(render_batch_jobs)()
+            else:
+                st.button("🔄 Refresh Jobs")
+                render_batch_jobs()
 
     with tab3:
         st.header("Simplification History")
 
-        if st.session_state.simplification_history:
-            history_df = pd.DataFrame(st.session_state.simplification_history)
+        history_store = get_history_store()
+        history_owner = get_history_owner()
+        earliest, latest = history_store.date_range(history_owner)
 
+        if earliest:
             # Filters
             col1, col2, col3 = st.columns(3)
             with col1:
-                level_filter = st.multiselect("Filter by Level",
-                                              options=history_df['level'].unique(),
-                                              default=history_df['level'].unique())
+                level_options = history_store.distinct(history_owner, 'level')
+                level_filter = st.multiselect("Filter by Level", options=level_options, default=level_options)
+            with col2:
+                subject_options = history_store.distinct(history_owner, 'subject')
+                subject_filter = st.multiselect("Filter by Subject", options=subject_options,
+                                                default=subject_options)
+            with col3:
+                first_day = datetime.date.fromisoformat(earliest[:10])
+                last_day = datetime.date.fromisoformat(latest[:10])
+                date_filter = st.date_input("Filter by Date", value=(first_day, last_day),
+                                            min_value=first_day, max_value=last_day)
+
+            # Filtering and paging run in the history database, not on a full DataFrame
+            history_filters = {'levels': level_filter, 'subjects': subject_filter}
+            if isinstance(date_filter, (tuple, list)) and len(date_filter) == 2:
+                history_filters['start'], history_filters['end'] = date_filter
+            total_rows = history_store.count(history_owner, **history_filters)
+
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                page_size = st.selectbox("Rows per page", [25, 50, 100], index=1)
+            page_count = max(1, -(-total_rows // page_size))
             with col2:
-                subject_filter = st.multiselect("Filter by Subject",
-                                                options=history_df['subject'].unique(),
-                                                default=history_df['subject'].unique())
-
-            # Apply filters
-            filtered_df = history_df[
-                (history_df['level'].isin(level_filter)) &
-                (history_df['subject'].isin(subject_filter))
-                ]
-
-            st.dataframe(filtered_df)
-
-            # Download history
-            csv_data = filtered_df.to_csv(index=False)
-            st.download_button(
-                label="📥 Download History",
-                data=csv_data,
-                file_name="simplification_history.csv",
-                mime="text/csv"
+                page_number = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1)
+
+            page_rows = history_store.page(
+                history_owner,
+                limit=page_size,
+                offset=(page_number - 1) * page_size,
+                **history_filters
             )
+            st.caption(f"Showing {len(page_rows)} of {total_rows} matching records")
+            st.dataframe(add_readability_columns(pd.DataFrame(page_rows, columns=HISTORY_COLUMNS)))
+
+            # Readability over every matching record, computed on demand
+            if st.button("📏 Readability by Level"):
+                st.session_state.history_readability = history_store.readability_by_level(history_owner,
+                                                                                          **history_filters)
+            if st.session_state.get('history_readability') is not None:
+                st.caption("Mean Flesch-Kincaid grade, words per sentence and output/input length by level")
+                st.dataframe(st.session_state.history_readability)
+
+            # Download history, streamed to a file on demand rather than rebuilt on every rerun
+            if st.button("📦 Prepare History Export"):
+                discard_history_export()
+                with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as export_file:
+                    export_path = export_file.name
+                history_store.export_csv(history_owner, export_path, **history_filters)
+                st.session_state.history_export_path = export_path
+
+            export_path = st.session_state.get('history_export_path')
+            if export_path and os.path.exists(export_path):
+                with open(export_path, 'rb') as export_file:
+                    st.download_button(
+                        label="📥 Download History",
+                        data=export_file,
+                        file_name="simplification_history.csv",
+                        mime="text/csv"
+                    )
 
             # Clear history
             if st.button("🗑️ Clear History", type="secondary"):
-                st.session_state.simplification_history = []
+                history_store.clear(history_owner)
+                discard_history_export()
+                st.session_state.pop('history_readability', None)
                 st.rerun()
         else:
             st.info("No simplification history yet. Start simplifying content to see history here.")
@@ -498,26 +851,31 @@ if st.session_state.is_configured:
     with tab4:
         st.header("Template Information")
 
+        if st.button("🔄 Refresh Template"):
+            get_template_cache().refresh(st.session_state.prompt_template_id)
+
         try:
             # Load and display template
-            prompt_text = st.session_state.prompt_mgr.load_prompt(
-                prompt_id=st.session_state.prompt_template_id,
-                astype=PromptTemplateFormats.STRING
-            )
+            renderer = get_prompt_renderer()
+            template_age = get_template_cache().age(st.session_state.prompt_template_id)
 
             st.subheader("Current Template")
-            st.code(prompt_text, language="text")
+            st.caption(f"Cached {int(template_age or 0)}s ago, reloaded every {get_template_cache().ttl}s")
+            st.code(renderer.text, language="text")
 
             st.subheader("Template Variables")
             st.write("This template expects the following variables:")
             st.write("- `{level}` - Learning level (beginner, intermediate, advanced)")
             st.write("- `{subject}` - Academic subject")
             st.write("- `{content}` - Content to be simplified")
+            if renderer.missing_variables:
+                missing = ", ".join(f"`{{{name}}}`" for name in renderer.missing_variables)
+                st.warning(f"⚠️ Template does not use: {missing}")
 
             # List all templates
             st.subheader("Available Templates")
             try:
-                templates = st.session_state.prompt_mgr.list()
+                templates = list_templates(st.session_state.prompt_mgr, get_history_owner())
                 if isinstance(templates, dict) and 'resources' in templates:
                     template_data = []
                     for template in templates['resources']:
@@ -533,6 +891,50 @@ if st.session_state.is_configured:
         except Exception as e:
             st.error(f"Error loading template: {str(e)}")
 
+    with tab5:
+        st.header("Request Metrics")
+        st.caption("Template loads and generation calls made by this app process, across all sessions")
+        governor_stats = get_rate_governor().stats()
+        st.caption(f"In flight: {governor_stats['in_flight']} of {governor_stats['concurrency_limit']} · "
+                   f"Batch: {governor_stats['batch_in_flight']} of {governor_stats['batch_limit']} · "
+                   f"Waiting: {governor_stats['waiting']}")
+
+        metrics_summary = REGISTRY.summary()
+        if metrics_summary:
+            st.subheader("Latency by Operation")
+            st.dataframe(pd.DataFrame(metrics_summary))
+
+            metrics_operation = st.selectbox("Operation", [row['operation'] for row in metrics_summary])
+            col1, col2 = st.columns(2)
+            with col1:
+                st.subheader("Latency (s)")
+                latency_buckets = REGISTRY.histogram_buckets('simplifier_operation_duration_seconds',
+                                                             operation=metrics_operation)
+                if latency_buckets:
+                    st.bar_chart(pd.DataFrame(latency_buckets, columns=['le', 'calls']).set_index('le'))
+            with col2:
+                st.subheader("Output Tokens")
+                token_buckets = REGISTRY.histogram_buckets('simplifier_output_tokens', operation=metrics_operation)
+                if token_buckets:
+                    st.bar_chart(pd.DataFrame(token_buckets, columns=['le', 'calls']).set_index('le'))
+
+            error_classes = REGISTRY.error_classes()
+            if error_classes:
+                st.subheader("Errors by Class")
+                st.dataframe(pd.DataFrame(
+                    [{'operation': op, 'error_class': cls, 'count': count}
+                     for (op, cls), count in error_classes.items()]
+                ))
+
+            with st.expander("📄 Prometheus Format"):
+                st.code(REGISTRY.to_prometheus(), language="text")
+
+            if st.button("🗑️ Reset Metrics"):
+                REGISTRY.reset()
+                st.rerun()
+        else:
+            st.info("No requests recorded yet. Simplify some content to see metrics here.")
+
 else:
     # Not configured yet
     st.info("👈 Please configure your Watsonx.ai settings in the sidebar to get started.")
@@ -588,6 +990,17 @@ else:
     Then install python-dotenv: `pip install python-dotenv`
     """)
 
+# Response cache counters
+cache_stats = get_response_cache().stats()
+cache_stats_placeholder.caption(f"Hits: {cache_stats['hits']} · Misses: {cache_stats['misses']} · "
+                                f"Hit rate: {cache_stats['hit_rate']:.0%} · Entries: {cache_stats['entries']}")
+if use_semantic_cache:
+    semantic_stats = get_semantic_cache().stats()
+    semantic_stats_placeholder.caption(f"Similar hits: {semantic_stats['hits']} · "
+                                       f"Hit rate: {semantic_stats['hit_rate']:.0%} · "
+                                       f"Lookup: {semantic_stats['mean_lookup_ms']:.1f} ms · "
+                                       f"Entries: {semantic_stats['entries']}")
+
 # Footer
 st.markdown("---")
 st.markdown("Built with ❤️ using Streamlit and IBM Watsonx.ai")
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""Generation backends behind a common generate / stream / batch interface.
+
+The simplification helpers in watsonx_utils only talk to a GenerationBackend,
+so Watsonx.ai, the offline local stand-in and a router that sends short
+content to a smaller model are interchangeable.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from chunking import estimate_tokens
+from fake_watsonx import FakeModelInference
+from metrics import REGISTRY
+
+DEFAULT_SHORT_CONTENT_TOKENS = 200
+LOCAL_MODEL_ID = "local/fake"
+
+
+class GenerationBackend:
+    """Interface implemented by every generation backend"""
+
+    model_id = None
+
+    def generate(self, prompt, params):
+        """Return the generated text for one prompt"""
+        raise NotImplementedError
+
+    def stream(self, prompt, params):
+        """Yield the generated text for one prompt in chunks"""
+        raise NotImplementedError
+
+    def generate_batch(self, prompts, params, concurrency_limit=8):
+        """Return the generated text for each prompt, failing as a whole if any prompt fails"""
+        if not prompts:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency_limit, len(prompts)))) as pool:
+            return list(pool.map(lambda prompt: self.generate(prompt, params), prompts))
+
+    def select(self, content):
+        """Return the backend that should simplify this content"""
+        return self
+
+
+class WatsonxBackend(GenerationBackend):
+    """Generation with a Watsonx.ai ModelInference, or any object with the same methods"""
+
+    def __init__(self, model_inference):
+        self.model_inference = model_inference
+
+    @property
+    def model_id(self):
+        return self.model_inference.model_id
+
+    def generate(self, prompt, params):
+        return self.model_inference.generate_text(prompt=prompt, params=params)
+
+    def stream(self, prompt, params):
+        return self.model_inference.generate_text_stream(prompt=prompt, params=params)
+
+    def generate_batch(self, prompts, params, concurrency_limit=8):
+        # The SDK sends a list of prompts concurrently within a single call
+        return self.model_inference.generate_text(prompt=list(prompts), params=params,
+                                                  concurrency_limit=concurrency_limit)
+
+
+class LocalBackend(WatsonxBackend):
+    """Deterministic offline backend for tests, benchmarks and demos without credentials.
+
+    Responses are derived from the prompt alone. Options such as latency,
+    error_rate and tokens_per_second are passed to FakeModelInference; any
+    injected jitter or errors are seeded so runs repeat exactly.
+    """
+
+    def __init__(self, model_id=LOCAL_MODEL_ID, seed=0, **options):
+        super().__init__(FakeModelInference(model_id=model_id, seed=seed, **options))
+
+
+class RoutedBackend(GenerationBackend):
+    """Send content of up to max_short_tokens to a smaller model and everything else to the default one.
+
+    Routing happens in select(), so cache keys and journals record the model
+    that actually generated each response. Calls made on the router itself
+    go to the default model.
+    """
+
+    def __init__(self, default, short, max_short_tokens=DEFAULT_SHORT_CONTENT_TOKENS):
+        self.default = default
+        self.short = short
+        self.max_short_tokens = max_short_tokens
+
+    @property
+    def model_id(self):
+        return f"{self.short.model_id}<={self.max_short_tokens}|{self.default.model_id}"
+
+    def select(self, content):
+        backend = self.short if estimate_tokens(content) <= self.max_short_tokens else self.default
+        REGISTRY.inc('simplifier_routed_total', help_text="Generations routed to each model",
+                     model=backend.model_id)
+        return backend.select(content)
+
+    def generate(self, prompt, params):
+        return self.default.generate(prompt, params)
+
+    def stream(self, prompt, params):
+        return self.default.stream(prompt, params)
+
+    def generate_batch(self, prompts, params, concurrency_limit=8):
+        return self.default.generate_batch(prompts, params, concurrency_limit)
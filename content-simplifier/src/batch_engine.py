@@ -0,0 +1,128 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Optional
+
+DEFAULT_MAX_WORKERS = 4
+
+
+@dataclass
+class BatchOutcome:
+    """Result of processing a single batch row"""
+    index: int
+    row: Any
+    result: Any = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def iter_batch(rows, process_row, max_workers=DEFAULT_MAX_WORKERS, ordered=True):
+    """Run process_row over rows keeping at most max_workers calls in flight.
+
+    Rows are pulled lazily from any iterable, so only a small window of rows is
+    held in memory at once. Outcomes are yielded in input order when ordered is
+    True, otherwise as soon as each row completes.
+    """
+    max_workers = max(1, int(max_workers))
+    window = max_workers * 2
+    source = iter(enumerate(rows))
+    pending = {}
+    completed = {}
+    next_index = 0
+    exhausted = False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            while True:
+                # Top up the in-flight window without reading ahead of it
+                while not exhausted and len(pending) + len(completed) < window:
+                    try:
+                        index, row = next(source)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[pool.submit(process_row, row)] = (index, row)
+
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index, row = pending.pop(future)
+                    error = future.exception()
+                    outcome = BatchOutcome(
+                        index=index,
+                        row=row,
+                        result=None if error else future.result(),
+                        error=error
+                    )
+                    if ordered:
+                        completed[index] = outcome
+                    else:
+                        yield outcome
+
+                while next_index in completed:
+                    yield completed.pop(next_index)
+                    next_index += 1
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def run_batch(rows, process_row, max_workers=DEFAULT_MAX_WORKERS, on_progress=None):
+    """Process all rows concurrently and return outcomes in input order.
+
+    on_progress(completed, total, outcome) is called from the calling thread as
+    each row finishes, in completion order.
+    """
+    rows = list(rows)
+    total = len(rows)
+    outcomes = [None] * total
+
+    for completed, outcome in enumerate(iter_batch(rows, process_row, max_workers, ordered=False), start=1):
+        outcomes[outcome.index] = outcome
+        if on_progress is not None:
+            on_progress(completed, total, outcome)
+
+    return outcomes
+
+
+def split_concurrency(max_workers, block_size):
+    """Divide max_workers generations into (blocks in flight, prompts generated concurrently per block)"""
+    max_workers = max(1, int(max_workers))
+    per_block = max(1, min(int(block_size), max_workers))
+    return max(1, max_workers // per_block), per_block
+
+
+def _blocks(rows, block_size):
+    block = []
+    for row in rows:
+        block.append(row)
+        if len(block) == block_size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def iter_blocks(rows, process_block, block_size, max_workers=DEFAULT_MAX_WORKERS, ordered=True):
+    """Like iter_batch, but hand process_block lists of up to block_size rows.
+
+    process_block returns one entry per row, where an exception instance marks
+    that row as failed; if it raises, every row of the block fails with the
+    error. Outcomes are still yielded per row, indexed by input position.
+    """
+    block_size = max(1, int(block_size))
+    for outcome in iter_batch(_blocks(rows, block_size), process_block, max_workers, ordered):
+        results = outcome.result if outcome.ok else [outcome.error] * len(outcome.row)
+        start = outcome.index * block_size
+        for offset, (row, result) in enumerate(zip(outcome.row, results)):
+            failed = isinstance(result, BaseException)
+            yield BatchOutcome(
+                index=start + offset,
+                row=row,
+                result=None if failed else result,
+                error=result if failed else None
+            )
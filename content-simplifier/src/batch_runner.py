@@ -0,0 +1,351 @@
+"""Headless batch simplification for large CSV/JSONL files.
+
+Rows are read in chunks, pushed through a bounded worker pool and written to
+the output file as they complete, so memory use does not grow with the input.
+Completed rows are recorded in a job journal, so rerunning the same command
+after a crash resumes where it stopped and only retries failed rows.
+
+Usage:
+    python src/batch_runner.py data/sample_batch.csv -o results.csv
+    python src/batch_runner.py data/sample_batch.csv -o results.csv --backend local
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from backends import DEFAULT_SHORT_CONTENT_TOKENS, LocalBackend, RoutedBackend
+from batch_engine import DEFAULT_MAX_WORKERS, iter_batch, iter_blocks, split_concurrency
+from fake_watsonx import FakePromptTemplateManager
+from job_journal import JobJournal, JournalMismatch, journal_name, journaled, journaled_block, make_job_fingerprint
+from metrics import start_metrics_server
+from readability import READABILITY_COLUMNS, readability_scores
+from rate_limit import DEFAULT_REQUESTS_PER_MINUTE, RateGovernor
+from response_cache import ResponseCache
+from semantic_cache import SemanticCache
+from template_cache import PromptRenderer
+from watsonx_utils import build_generation_params, load_template_text, setup_watsonx, simplify_block, simplify_content
+
+REQUIRED_COLUMNS = ['level', 'subject', 'content']
+LEVELS = ['beginner', 'intermediate', 'advanced']
+OUTPUT_COLUMNS = ['row', 'level', 'subject', 'original_content', 'simplified_content', 'error']
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def _file_format(path):
+    return 'jsonl' if Path(path).suffix.lower() in ('.jsonl', '.ndjson') else 'csv'
+
+
+def read_rows(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield input rows as dicts, reading at most chunk_size rows at a time"""
+    if _file_format(path) == 'jsonl':
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, start=1):
+                if line.strip():
+                    record = json.loads(line)
+                    missing = [col for col in REQUIRED_COLUMNS if col not in record]
+                    if missing:
+                        raise ValueError(f"JSONL records must contain fields: {', '.join(REQUIRED_COLUMNS)} "
+                                         f"(line {number} is missing {', '.join(missing)})")
+                    yield {col: record[col] for col in REQUIRED_COLUMNS}
+        return
+
+    for chunk in pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False):
+        missing = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+        if missing:
+            raise ValueError(f"CSV must contain columns: {', '.join(REQUIRED_COLUMNS)}")
+        yield from chunk[REQUIRED_COLUMNS].to_dict('records')
+
+
+def expand_levels(rows):
+    """Fan rows out into one row per level.
+
+    A level cell may list several levels separated by "|", or be "all" for
+    every level; other rows are passed through unchanged.
+    """
+    for row in rows:
+        level = str(row['level']).strip()
+        if level.lower() == 'all':
+            levels = LEVELS
+        elif '|' in level:
+            levels = [part.strip() for part in level.split('|') if part.strip()]
+        else:
+            yield row
+            continue
+        for part in levels:
+            yield dict(row, level=part)
+
+
+class ResultWriter:
+    """Write results to a CSV or JSONL file in blocks of flush_every rows.
+
+    Each block is scored for readability in one vectorized pass before it is
+    written.
+    """
+
+    def __init__(self, path, flush_every=100):
+        self.format = _file_format(path)
+        self.flush_every = flush_every
+        self._pending = []
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        if self.format == 'csv':
+            self._writer = csv.DictWriter(self._file, fieldnames=OUTPUT_COLUMNS + READABILITY_COLUMNS)
+            self._writer.writeheader()
+
+    def write(self, record):
+        self._pending.append(record)
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        scores = readability_scores(
+            [record['simplified_content'] for record in self._pending],
+            [record['original_content'] for record in self._pending]
+        ).to_dict('records')
+        for record, score in zip(self._pending, scores):
+            # NaN marks rows without output, written as an empty value
+            record = dict(record, **{name: None if value != value else value for name, value in score.items()})
+            if self.format == 'csv':
+                self._writer.writerow(record)
+            else:
+                self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run_file(input_path, output_path, simplify_row, max_workers=DEFAULT_MAX_WORKERS,
+             chunk_size=DEFAULT_CHUNK_SIZE, on_progress=None, journal=None, simplify_rows=None, block_size=1):
+    """Simplify every row of input_path into output_path.
+
+    When a journal is given, rows it already holds results for are written
+    without generating again. When simplify_rows is given and block_size is
+    above 1, rows are generated in blocks of block_size with it instead of
+    one simplify_row call each. Returns succeeded/failed/resumed row counts.
+    """
+    counts = {'succeeded': 0, 'failed': 0, 'resumed': 0}
+    rows = enumerate(expand_levels(read_rows(input_path, chunk_size)))
+    if simplify_rows is not None and block_size > 1:
+        if journal is not None:
+            process = journaled_block(simplify_rows, journal)
+        else:
+            def process(items):
+                results = simplify_rows([row for _, row in items])
+                return [result if isinstance(result, Exception) else (result, False) for result in results]
+        blocks_in_flight, _ = split_concurrency(max_workers, block_size)
+        outcomes = iter_blocks(rows, process, block_size, blocks_in_flight)
+    else:
+        if journal is not None:
+            process = journaled(simplify_row, journal)
+        else:
+            def process(item):
+                return simplify_row(item[1]), False
+        outcomes = iter_batch(rows, process, max_workers)
+
+    with ResultWriter(output_path) as writer:
+        for outcome in outcomes:
+            index, row = outcome.row
+            if outcome.ok:
+                result, resumed = outcome.result
+                counts['succeeded'] += 1
+                counts['resumed'] += int(resumed)
+            else:
+                result = ''
+                counts['failed'] += 1
+            writer.write({
+                'row': index,
+                'level': row['level'],
+                'subject': row['subject'],
+                'original_content': row['content'],
+                'simplified_content': result,
+                'error': '' if outcome.ok else str(outcome.error)
+            })
+            if on_progress is not None:
+                on_progress(counts)
+
+    return counts
+
+
+def make_row_simplifier(backend, renderer, params, response_cache=None, governor=None,
+                        semantic_cache=None):
+    """Bind the model and template into a process_row callable for the batch engine"""
+    def simplify_row(row):
+        return simplify_content(
+            backend,
+            renderer,
+            row['level'],
+            row['subject'],
+            row['content'],
+            params,
+            response_cache=response_cache,
+            governor=governor,
+            semantic_cache=semantic_cache
+        )
+
+    return simplify_row
+
+
+def make_block_simplifier(backend, renderer, params, response_cache=None, governor=None,
+                          concurrency_limit=DEFAULT_MAX_WORKERS, semantic_cache=None):
+    """Bind the model and template into a process_block callable for multi-prompt generation"""
+    def simplify_rows(rows):
+        return simplify_block(
+            backend,
+            renderer,
+            rows,
+            params,
+            response_cache=response_cache,
+            governor=governor,
+            concurrency_limit=concurrency_limit,
+            semantic_cache=semantic_cache
+        )
+
+    return simplify_rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simplify a CSV/JSONL file of course content with Watsonx.ai")
+    parser.add_argument("input", help="Input .csv or .jsonl file with level, subject and content columns")
+    parser.add_argument("-o", "--output", required=True, help="Output .csv or .jsonl file")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="Number of generations kept in flight")
+    parser.add_argument("--block-size", type=int, default=1,
+                        help="Prompts sent per multi-prompt generate_text call (1 sends one prompt per call)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Rows read from the input per chunk")
+    parser.add_argument("--max-tokens", type=int, default=300)
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--decoding-method", choices=["greedy", "sample"], default="greedy")
+    parser.add_argument("--backend", choices=["watsonx", "local"], default="watsonx",
+                        help="Generate with Watsonx.ai, or with the deterministic offline stand-in")
+    parser.add_argument("--requests-per-minute", type=int, default=None,
+                        help="Cap on generation requests per minute, 0 for none (defaults to "
+                             f"WATSONX_REQUESTS_PER_MINUTE or {DEFAULT_REQUESTS_PER_MINUTE}; the local "
+                             "backend is only capped when this is given)")
+    parser.add_argument("--short-model-id", default=None,
+                        help="Model for short content (defaults to SHORT_MODEL_ID; unset sends everything "
+                             "to the default model)")
+    parser.add_argument("--short-content-tokens", type=int, default=None,
+                        help="Content up to this many tokens goes to the short content model "
+                             f"(defaults to SHORT_CONTENT_TOKENS or {DEFAULT_SHORT_CONTENT_TOKENS})")
+    parser.add_argument("--template-id", default=None,
+                        help="Prompt template asset ID (defaults to PROMPT_TEMPLATE_ASSET_ID)")
+    parser.add_argument("--no-cache", action="store_true", help="Do not reuse cached responses")
+    parser.add_argument("--semantic-cache", action="store_true",
+                        help="Also reuse responses to similar content for the same level and subject")
+    parser.add_argument("--semantic-threshold", type=float, default=None,
+                        help="Minimum cosine similarity for a similar response to be reused "
+                             "(defaults to SEMANTIC_CACHE_THRESHOLD or 0.9)")
+    parser.add_argument("--journal", default=None,
+                        help="Job journal used to resume interrupted runs "
+                             "(defaults to <output>.journal-<settings hash>.sqlite)")
+    parser.add_argument("--no-journal", action="store_true", help="Do not record or resume progress")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics at http://0.0.0.0:PORT/metrics while running")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    load_dotenv(dotenv_path=Path(__file__).parent.parent / '.env')
+
+    api_key = os.getenv('IBM_API_KEY')
+    project_id = os.getenv('IBM_PROJECT_ID')
+    region = os.getenv('IBM_REGION') or 'us-south'
+    template_id = args.template_id or os.getenv('PROMPT_TEMPLATE_ASSET_ID')
+    short_model_id = args.short_model_id or os.getenv('SHORT_MODEL_ID')
+    short_content_tokens = args.short_content_tokens or int(os.getenv('SHORT_CONTENT_TOKENS')
+                                                            or DEFAULT_SHORT_CONTENT_TOKENS)
+    if args.backend == 'watsonx' and not (api_key and project_id and template_id):
+        print("❌ IBM_API_KEY, IBM_PROJECT_ID and PROMPT_TEMPLATE_ASSET_ID must be set", file=sys.stderr)
+        return 2
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+
+    if args.backend == 'local':
+        backend, prompt_mgr = LocalBackend(), FakePromptTemplateManager()
+        if short_model_id:
+            backend = RoutedBackend(backend, LocalBackend(model_id=short_model_id), short_content_tokens)
+        template_id = template_id or 'local'
+    else:
+        _, backend, prompt_mgr = setup_watsonx(api_key, project_id, region, short_model_id=short_model_id,
+                                               max_short_tokens=short_content_tokens)
+    renderer = PromptRenderer(load_template_text(prompt_mgr, template_id))
+    params = build_generation_params(args.max_tokens, args.temperature, args.decoding_method)
+    response_cache = None if args.no_cache else ResponseCache()
+    semantic_cache = SemanticCache(threshold=args.semantic_threshold) if args.semantic_cache else None
+    # The offline stand-in has no service quota to protect, so it runs as fast as it can unless asked not to
+    governor = None
+    if args.backend == 'watsonx' or args.requests_per_minute is not None:
+        governor = RateGovernor.from_env(requests_per_minute=args.requests_per_minute)
+    simplify_row = make_row_simplifier(backend, renderer, params, response_cache=response_cache,
+                                       governor=governor, semantic_cache=semantic_cache)
+    _, per_block = split_concurrency(args.concurrency, args.block_size)
+    simplify_rows = make_block_simplifier(backend, renderer, params, response_cache=response_cache,
+                                          governor=governor, concurrency_limit=per_block,
+                                          semantic_cache=semantic_cache)
+
+    journal = None
+    if not args.no_journal:
+        fingerprint = make_job_fingerprint(renderer.text, backend.model_id, params)
+        # A journal per settings, so changing them starts afresh and changing them back resumes
+        output = Path(args.output)
+        try:
+            journal = JobJournal(args.journal or output.parent / journal_name(f"{output.name}.journal", fingerprint),
+                                 fingerprint=fingerprint)
+        except JournalMismatch as e:
+            print(f"❌ {e}; pass another --journal or delete it", file=sys.stderr)
+            return 2
+        previous = journal.stats()
+        if previous['done'] or previous['failed']:
+            print(f"🔄 Resuming: {previous['done']} rows already completed, "
+                  f"{previous['failed']} failed rows will be retried", file=sys.stderr)
+
+    started = time.time()
+
+    def report(counts):
+        done = counts['succeeded'] + counts['failed']
+        if done % 100 == 0:
+            print(f"Processed {done} rows ({done / (time.time() - started):.1f} rows/s)", file=sys.stderr)
+
+    try:
+        counts = run_file(
+            args.input,
+            args.output,
+            simplify_row,
+            max_workers=args.concurrency,
+            chunk_size=args.chunk_size,
+            on_progress=report,
+            journal=journal,
+            simplify_rows=simplify_rows,
+            block_size=args.block_size
+        )
+    finally:
+        if journal is not None:
+            journal.close()
+
+    print(f"✅ Processed {counts['succeeded']} rows ({counts['resumed']} resumed), "
+          f"{counts['failed']} failed in {time.time() - started:.1f}s", file=sys.stderr)
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
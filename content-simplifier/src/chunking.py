@@ -0,0 +1,143 @@
+import re
+import time
+
+from batch_engine import DEFAULT_MAX_WORKERS, run_batch
+
+DEFAULT_CHUNK_TOKENS = 800
+DEFAULT_MERGE_TOKENS = 2000
+CHARS_PER_TOKEN = 4
+# Room in a merge's output budget over its input, since token counts are estimates
+MERGE_OUTPUT_MARGIN = 1.5
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text):
+    """Rough token count for Granite-style tokenizers (about four characters per token)"""
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def _split_oversized(text):
+    # Fall back from sentences to words for text that does not fit the budget
+    pieces = _SENTENCE_BREAK.split(text)
+    if len(pieces) == 1:
+        pieces = text.split()
+    return pieces
+
+
+def _pack(pieces, max_tokens, separator):
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for piece in pieces:
+        piece = piece.strip()
+        if not piece:
+            continue
+
+        piece_tokens = estimate_tokens(piece)
+        if piece_tokens > max_tokens:
+            if current:
+                chunks.append(separator.join(current))
+                current, current_tokens = [], 0
+            sub_pieces = _split_oversized(piece)
+            if len(sub_pieces) == 1:
+                # A single word longer than the budget cannot be split further
+                chunks.append(piece)
+            else:
+                chunks.extend(_pack(sub_pieces, max_tokens, " "))
+            continue
+
+        if current and current_tokens + piece_tokens > max_tokens:
+            chunks.append(separator.join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def split_into_chunks(text, max_tokens=DEFAULT_CHUNK_TOKENS):
+    """Split text on paragraph, then sentence, boundaries into chunks within a token budget"""
+    return _pack(_PARAGRAPH_BREAK.split(text), max_tokens, "\n\n")
+
+
+def _group(parts, max_tokens):
+    # Neighbouring parts joined into windows within the budget; a part is never split
+    windows = []
+    current = []
+    current_tokens = 0
+    for part in parts:
+        part_tokens = estimate_tokens(part)
+        if current and current_tokens + part_tokens > max_tokens:
+            windows.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(part)
+        current_tokens += part_tokens
+    if current:
+        windows.append("\n\n".join(current))
+    return windows
+
+
+def merge_output_tokens(text):
+    """Output budget for a merge of text, with room for all of it so the merge cannot truncate"""
+    return int(estimate_tokens(text) * MERGE_OUTPUT_MARGIN) + 50
+
+
+def simplify_long_content(content, simplify_chunk, max_tokens=DEFAULT_CHUNK_TOKENS,
+                          max_workers=DEFAULT_MAX_WORKERS, merge=None, merge_tokens=DEFAULT_MERGE_TOKENS):
+    """Simplify long content chunk by chunk in parallel and stitch the results.
+
+    simplify_chunk(text) simplifies one chunk. If merge is given, neighbouring
+    simplified chunks are grouped into windows of up to merge_tokens and
+    merge(text) smooths each window in parallel, so no merge call sees more
+    than merge_tokens (or one simplified chunk, if that is longer) however
+    long the document is; merge should allow merge_output_tokens(text) of
+    output. Returns the final text and a
+    per-chunk report with token estimates and latency.
+    """
+    chunks = split_into_chunks(content, max_tokens)
+
+    def timed(generate):
+        def run(text):
+            started = time.perf_counter()
+            result = generate(text)
+            return result, time.perf_counter() - started
+        return run
+
+    outcomes = run_batch(chunks, timed(simplify_chunk), max_workers=max_workers)
+
+    failed = [outcome for outcome in outcomes if not outcome.ok]
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(chunks)} chunks failed: {failed[0].error}")
+
+    report = [
+        {
+            'chunk': str(outcome.index + 1),
+            'input_tokens': estimate_tokens(outcome.row),
+            'latency_s': round(outcome.result[1], 3)
+        }
+        for outcome in outcomes
+    ]
+    parts = [outcome.result[0].strip() for outcome in outcomes]
+
+    if merge is not None and len(parts) > 1:
+        windows = _group(parts, merge_tokens)
+        merged = run_batch(windows, timed(merge), max_workers=max_workers)
+        failed = [outcome for outcome in merged if not outcome.ok]
+        if failed:
+            raise RuntimeError(f"{len(failed)} of {len(windows)} merge windows failed: {failed[0].error}")
+        report.extend(
+            {
+                'chunk': f"merge {outcome.index + 1}",
+                'input_tokens': estimate_tokens(outcome.row),
+                'latency_s': round(outcome.result[1], 3)
+            }
+            for outcome in merged
+        )
+        parts = [outcome.result[0].strip() for outcome in merged]
+
+    return "\n\n".join(parts), report
@@ -0,0 +1,125 @@
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+DEFAULT_NEAR_THRESHOLD = 0.9
+NUM_PERMUTATIONS = 64
+SHINGLE_SIZE = 3
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+_HASH_PRIME = 4294967291  # largest prime below 2**32
+
+
+def normalize_text(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = _PUNCTUATION.sub(' ', str(text).lower())
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def row_signature(row):
+    """Normalized (level, subject, content) used for exact duplicate detection"""
+    return normalize_text(row['level']), normalize_text(row['subject']), normalize_text(row['content'])
+
+
+class _DisjointSet:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, item):
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            # Keep the earliest row as the representative
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+class MinHasher:
+    """MinHash signatures over word shingles for estimating Jaccard similarity"""
+
+    def __init__(self, num_permutations=NUM_PERMUTATIONS, shingle_size=SHINGLE_SIZE, seed=1):
+        rng = np.random.RandomState(seed)
+        self.shingle_size = shingle_size
+        self._a = rng.randint(1, _HASH_PRIME, size=(num_permutations, 1), dtype=np.int64).astype(np.uint64)
+        self._b = rng.randint(0, _HASH_PRIME, size=(num_permutations, 1), dtype=np.int64).astype(np.uint64)
+
+    def shingles(self, text):
+        words = text.split()
+        if len(words) <= self.shingle_size:
+            return {' '.join(words)}
+        return {' '.join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def signature(self, text):
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode('utf-8')) for shingle in self.shingles(text)),
+            dtype=np.uint64
+        )
+        return ((self._a * hashes + self._b) % _HASH_PRIME).min(axis=1)
+
+
+def _near_duplicate_pairs(indexes, texts, threshold, hasher):
+    signatures = np.vstack([hasher.signature(text) for text in texts])
+    num_permutations = signatures.shape[1]
+
+    # Locality-sensitive hashing: rows sharing any band become candidate pairs
+    rows_per_band = 4
+    candidates = set()
+    for start in range(0, num_permutations, rows_per_band):
+        buckets = defaultdict(list)
+        for position, band in enumerate(signatures[:, start:start + rows_per_band]):
+            buckets[band.tobytes()].append(position)
+        for members in buckets.values():
+            for other in members[1:]:
+                candidates.add((members[0], other))
+
+    for first, second in candidates:
+        similarity = float(np.mean(signatures[first] == signatures[second]))
+        if similarity >= threshold:
+            yield indexes[first], indexes[second]
+
+
+def find_duplicates(rows, near_threshold=None):
+    """Map every row to the index of the row whose generation it can reuse.
+
+    Rows with the same normalized level, subject and content always share a
+    representative. When near_threshold is set, rows with the same level and
+    subject whose content has an estimated Jaccard similarity at or above it
+    are merged as well.
+    """
+    rows = list(rows)
+    groups = _DisjointSet(len(rows))
+    first_seen = {}
+    by_topic = defaultdict(list)
+
+    for index, row in enumerate(rows):
+        signature = row_signature(row)
+        if signature in first_seen:
+            groups.union(first_seen[signature], index)
+            continue
+        first_seen[signature] = index
+        by_topic[signature[:2]].append((index, signature[2]))
+
+    if near_threshold is not None:
+        hasher = MinHasher()
+        for members in by_topic.values():
+            if len(members) < 2:
+                continue
+            indexes, texts = zip(*members)
+            for first, second in _near_duplicate_pairs(indexes, texts, near_threshold, hasher):
+                groups.union(first, second)
+
+    return [groups.find(index) for index in range(len(rows))]
+
+
+def dedup_ratio(representatives):
+    """Fraction of rows that did not need their own generation"""
+    if not representatives:
+        return 0.0
+    return 1 - len(set(representatives)) / len(representatives)
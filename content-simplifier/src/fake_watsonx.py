@@ -0,0 +1,130 @@
+"""Local stand-ins for the Watsonx.ai SDK objects used by the app.
+
+These let the batch pipeline be exercised offline, with injected latency,
+errors and token throughput, so performance can be measured without calling
+IBM Cloud.
+"""
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+FAKE_TEMPLATE = (
+    "Rewrite the following {subject} content for a {level} learner.\n\n"
+    "Content:\n{content}\n\nSimplified version:"
+)
+
+
+class FakeApiError(Exception):
+    """Error raised by the fake backend, carrying an HTTP-like status code"""
+
+    def __init__(self, message, status_code=503):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FakeModelInference:
+    """Mimics ModelInference.generate_text with configurable latency, errors and throughput.
+
+    Each call takes latency seconds, multiplied by a lognormal factor when
+    latency_jitter (the sigma of the distribution) is set, plus the time to emit
+    the output at tokens_per_second. A fraction error_rate of calls raise
+    FakeApiError instead of returning, and calls above max_requests_per_second
+    are rejected with a 429 like the real service's rate limiter. A list of
+    prompts is generated concurrently and fails as a whole, as in the SDK.
+    """
+
+    def __init__(self, latency=0.0, model_id="ibm/granite-3-8b-instruct", latency_jitter=0.0,
+                 tokens_per_second=None, error_rate=0.0, seed=None, max_requests_per_second=None):
+        self.latency = latency
+        self.model_id = model_id
+        self.latency_jitter = latency_jitter
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.max_requests_per_second = max_requests_per_second
+        self.calls = 0
+        self.list_calls = 0
+        self.throttled = 0
+        self._recent_calls = deque()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_text(self, prompt=None, params=None, concurrency_limit=10, **kwargs):
+        if isinstance(prompt, list):
+            # Like the SDK, send the prompts concurrently and fail the call if any prompt fails
+            self.list_calls += 1
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency_limit, len(prompt)))) as pool:
+                return list(pool.map(lambda item: self.generate_text(item, params), prompt))
+
+        response = self._respond(prompt)
+        delay, fail = self._plan_call(response, params)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise FakeApiError("Service temporarily unavailable")
+        return response
+
+    def generate_text_stream(self, prompt=None, params=None, **kwargs):
+        """Yield the response word by word, spreading the latency across chunks"""
+        response = self._respond(prompt)
+        delay, fail = self._plan_call(response, params)
+        if fail:
+            if delay:
+                time.sleep(delay)
+            raise FakeApiError("Service temporarily unavailable")
+
+        words = response.split(" ")
+        for index, word in enumerate(words):
+            if delay:
+                time.sleep(delay / len(words))
+            yield word if index == 0 else " " + word
+
+    def _plan_call(self, response, params):
+        with self._lock:
+            self.calls += 1
+            if self.max_requests_per_second:
+                now = time.monotonic()
+                while self._recent_calls and now - self._recent_calls[0] >= 1.0:
+                    self._recent_calls.popleft()
+                if len(self._recent_calls) >= self.max_requests_per_second:
+                    self.throttled += 1
+                    raise FakeApiError("Too many requests", status_code=429)
+                self._recent_calls.append(now)
+            factor = self._random.lognormvariate(0, self.latency_jitter) if self.latency_jitter else 1.0
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+
+        delay = self.latency * factor
+        if self.tokens_per_second:
+            delay += self._output_tokens(response, params) / self.tokens_per_second
+        return delay, fail
+
+    @staticmethod
+    def _output_tokens(response, params):
+        tokens = max(1, math.ceil(len(response) / 4))
+        max_new_tokens = (params or {}).get('max_new_tokens')
+        return min(tokens, max_new_tokens) if max_new_tokens else tokens
+
+    @staticmethod
+    def _respond(prompt):
+        text = " ".join((prompt or "").split())
+        return f"Simplified ({len(text)} chars): {text[:120]}"
+
+
+class FakePromptTemplateManager:
+    """Mimics PromptTemplateManager.load_prompt returning a fixed template"""
+
+    def __init__(self, template=FAKE_TEMPLATE, latency=0.0):
+        self.template = template
+        self.latency = latency
+        self.loads = 0
+
+    def load_prompt(self, prompt_id, astype=None, **kwargs):
+        self.loads += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self.template
+
+    def list(self, **kwargs):
+        return {'resources': []}
@@ -0,0 +1,173 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+DEFAULT_HISTORY_PATH = Path(__file__).parent.parent / '.cache' / 'history.sqlite'
+HISTORY_COLUMNS = ['timestamp', 'level', 'subject', 'original_content', 'simplified_content', 'ttft_s', 'latency_s']
+
+
+def make_owner_id(api_key):
+    """Owner key for per-user records, derived from the API key without storing it"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+
+class HistoryStore:
+    """Persistent simplification history with indexed, paginated filtering"""
+
+    def __init__(self, path=None):
+        self.path = Path(path or os.getenv('HISTORY_DB_PATH') or DEFAULT_HISTORY_PATH)
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                owner TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                level TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                original_content TEXT NOT NULL,
+                simplified_content TEXT NOT NULL,
+                ttft_s REAL,
+                latency_s REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS history_owner_time ON history (owner, timestamp)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS history_owner_level ON history (owner, level)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS history_owner_subject ON history (owner, subject)")
+
+    def add(self, owner, record):
+        """Append one simplification record"""
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO history (owner, {', '.join(HISTORY_COLUMNS)}) "
+                f"VALUES (?, {', '.join('?' for _ in HISTORY_COLUMNS)})",
+                [owner] + [record.get(column) for column in HISTORY_COLUMNS]
+            )
+
+    def distinct(self, owner, column):
+        """Distinct values of level or subject, for filter options"""
+        if column not in ('level', 'subject'):
+            raise ValueError(f"Cannot list distinct values of {column}")
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT {column} FROM history WHERE owner = ? ORDER BY {column}", (owner,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def date_range(self, owner):
+        """(earliest, latest) timestamps, or (None, None) when empty"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT MIN(timestamp), MAX(timestamp) FROM history WHERE owner = ?", (owner,)
+            ).fetchone()
+
+    def _where(self, owner, levels=None, subjects=None, start=None, end=None):
+        clauses = ["owner = ?"]
+        args = [owner]
+        if levels is not None:
+            clauses.append(f"level IN ({', '.join('?' for _ in levels)})" if levels else "0")
+            args.extend(levels)
+        if subjects is not None:
+            clauses.append(f"subject IN ({', '.join('?' for _ in subjects)})" if subjects else "0")
+            args.extend(subjects)
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            args.append(str(start))
+        if end is not None:
+            # Dates are inclusive, so compare against the end of the day
+            clauses.append("timestamp <= ?")
+            args.append(f"{end} 23:59:59")
+        return " AND ".join(clauses), args
+
+    def count(self, owner, **filters):
+        where, args = self._where(owner, **filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM history WHERE {where}", args).fetchone()[0]
+
+    def page(self, owner, limit=50, offset=0, **filters):
+        """One page of matching records, newest first"""
+        where, args = self._where(owner, **filters)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(HISTORY_COLUMNS)} FROM history WHERE {where} "
+                f"ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+                args + [limit, offset]
+            ).fetchall()
+        return [dict(zip(HISTORY_COLUMNS, row)) for row in rows]
+
+    def iter_rows(self, owner, batch_size=500, **filters):
+        """Yield matching rows in batches without loading them all at once"""
+        where, args = self._where(owner, **filters)
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT id, {', '.join(HISTORY_COLUMNS)} FROM history WHERE {where} AND id > ? "
+                    f"ORDER BY id LIMIT ?",
+                    args + [last_id, batch_size]
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            for row in rows:
+                yield row[1:]
+
+    def iter_scored_frames(self, owner, batch_size=5000, **filters):
+        """Yield matching records as DataFrames of up to batch_size rows with readability columns"""
+        # pandas is only needed here, so the app's landing page does not load it
+        import pandas as pd
+        from readability import add_readability_columns
+
+        batch = []
+        for row in self.iter_rows(owner, batch_size=batch_size, **filters):
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield add_readability_columns(pd.DataFrame(batch, columns=HISTORY_COLUMNS))
+                batch = []
+        if batch:
+            yield add_readability_columns(pd.DataFrame(batch, columns=HISTORY_COLUMNS))
+
+    def export_csv(self, owner, path, **filters):
+        """Stream matching rows with readability scores into a CSV file and return the number written"""
+        import pandas as pd
+        from readability import READABILITY_COLUMNS
+
+        written = 0
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            for frame in self.iter_scored_frames(owner, **filters):
+                frame.to_csv(f, header=written == 0, index=False)
+                written += len(frame)
+            if written == 0:
+                pd.DataFrame(columns=HISTORY_COLUMNS + READABILITY_COLUMNS).to_csv(f, index=False)
+        return written
+
+    def readability_by_level(self, owner, **filters):
+        """Mean readability scores per level over every matching record"""
+        import pandas as pd
+        from readability import READABILITY_COLUMNS
+
+        partials = []
+        for frame in self.iter_scored_frames(owner, **filters):
+            grouped = frame.groupby('level')
+            partials.append(pd.concat([
+                grouped[READABILITY_COLUMNS].sum(),
+                grouped[READABILITY_COLUMNS].count().add_suffix('_n'),
+                grouped.size().rename('records')
+            ], axis=1))
+        if not partials:
+            return pd.DataFrame(columns=['level', 'records'] + READABILITY_COLUMNS)
+
+        # Combine per-batch sums so the whole history never has to be in memory at once
+        totals = pd.concat(partials).groupby(level=0).sum()
+        means = pd.DataFrame({column: totals[column] / totals[f'{column}_n'] for column in READABILITY_COLUMNS})
+        means.insert(0, 'records', totals['records'])
+        return means.round(2).rename_axis('level').reset_index()
+
+    def clear(self, owner):
+        with self._lock:
+            self._conn.execute("DELETE FROM history WHERE owner = ?", (owner,))
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_JOURNAL_DIR = Path(__file__).parent.parent / '.cache' / 'jobs'
+
+
+def journal_dir():
+    """Directory of the job queue's journals, JOB_JOURNAL_DIR or .cache/jobs"""
+    return Path(os.getenv('JOB_JOURNAL_DIR') or DEFAULT_JOURNAL_DIR)
+
+
+def purge_journals(directory, max_age_seconds):
+    """Delete journals in directory not written to for max_age_seconds, returning how many were deleted"""
+    cutoff = time.time() - max_age_seconds
+    deleted = 0
+    for path in Path(directory).glob('*.sqlite'):
+        # WAL-mode writes land in the -wal file first, so it counts as activity too
+        companions = [Path(f"{path}{suffix}") for suffix in ('-wal', '-shm')]
+        try:
+            last_write = max(file.stat().st_mtime for file in [path] + companions if file.exists())
+        except OSError:
+            continue
+        if last_write < cutoff:
+            for file in [path] + companions:
+                try:
+                    file.unlink()
+                except FileNotFoundError:
+                    pass
+            deleted += 1
+    return deleted
+
+
+def make_row_key(index, row):
+    """Stable key for one input row, changing if the row's content changes"""
+    payload = json.dumps([index, row['level'], row['subject'], row['content']], default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def journal_name(key, fingerprint):
+    """File name of the journal for one input under one set of generation settings"""
+    return f"{key}-{fingerprint[:16]}.sqlite"
+
+
+def make_job_fingerprint(template_text, model_id, params):
+    """Identify the generation settings a journal's results were produced with"""
+    payload = json.dumps({
+        'template': template_text,
+        'model_id': model_id,
+        'params': {str(name): getattr(value, 'value', value) for name, value in params.items()}
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class JournalMismatch(ValueError):
+    """The journal holds results produced with different generation settings"""
+
+
+class JobJournal:
+    """Append-only record of completed and failed batch rows, used to resume interrupted jobs.
+
+    A journal only ever holds results for one fingerprint; opening it with
+    another raises JournalMismatch, so callers keep one journal per settings.
+    """
+
+    def __init__(self, path, fingerprint=None):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rows (
+                row_key TEXT PRIMARY KEY,
+                row_index INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 1,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+        if fingerprint is not None:
+            self._check_fingerprint(fingerprint)
+
+    def _check_fingerprint(self, fingerprint):
+        # Another job may be writing to this file, so a mismatch is never resolved by clearing it
+        self._conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('fingerprint', ?)", (fingerprint,))
+        stored = self._conn.execute("SELECT value FROM meta WHERE name = 'fingerprint'").fetchone()[0]
+        if stored != fingerprint:
+            self._conn.close()
+            raise JournalMismatch(f"Journal {self.path} was written with different generation settings")
+
+    def completed_result(self, row_key):
+        """Return the stored result for a completed row, or None if it still needs processing"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM rows WHERE row_key = ? AND status = 'done'", (row_key,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def record_success(self, row_key, row_index, result):
+        self._record(row_key, row_index, 'done', result, None)
+
+    def record_failure(self, row_key, row_index, error):
+        self._record(row_key, row_index, 'failed', None, str(error))
+
+    def _record(self, row_key, row_index, status, result, error):
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO rows (row_key, row_index, status, result, error, attempts, updated_at)
+                VALUES (?, ?, ?, ?, ?, 1, ?)
+                ON CONFLICT(row_key) DO UPDATE SET
+                    status = excluded.status,
+                    result = excluded.result,
+                    error = excluded.error,
+                    attempts = rows.attempts + 1,
+                    updated_at = excluded.updated_at
+            """, (row_key, row_index, status, result, error, time.time()))
+
+    def stats(self):
+        """Number of completed and failed rows recorded so far"""
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM rows GROUP BY status").fetchall())
+        return {'done': counts.get('done', 0), 'failed': counts.get('failed', 0)}
+
+    def close(self):
+        self._conn.close()
+
+
+def journaled(process_row, journal):
+    """Wrap a process_row callable so completed rows are served from the journal.
+
+    The wrapped callable takes (index, row) pairs and returns (result, resumed).
+    """
+    def process(item):
+        index, row = item
+        row_key = make_row_key(index, row)
+        stored = journal.completed_result(row_key)
+        if stored is not None:
+            return stored, True
+
+        try:
+            result = process_row(row)
+        except Exception as e:
+            journal.record_failure(row_key, index, e)
+            raise
+        journal.record_success(row_key, index, result)
+        return result, False
+
+    return process
+
+
+def journaled_block(process_block, journal):
+    """Block counterpart of journaled for iter_blocks.
+
+    Only rows without a stored result are passed on to process_block; each
+    entry of the returned list is (result, resumed) or the row's exception.
+    """
+    def process(items):
+        results = [None] * len(items)
+        pending = []
+        for position, (index, row) in enumerate(items):
+            row_key = make_row_key(index, row)
+            stored = journal.completed_result(row_key)
+            if stored is not None:
+                results[position] = (stored, True)
+            else:
+                pending.append((position, index, row_key, row))
+
+        if pending:
+            try:
+                generated = process_block([row for _, _, _, row in pending])
+            except Exception as e:
+                generated = [e] * len(pending)
+            for (position, index, row_key, _), result in zip(pending, generated):
+                if isinstance(result, Exception):
+                    journal.record_failure(row_key, index, result)
+                    results[position] = result
+                else:
+                    journal.record_success(row_key, index, result)
+                    results[position] = (result, False)
+        return results
+
+    return process
@@ -0,0 +1,558 @@
+"""Background batch jobs that outlive the browser session.
+
+The Batch Processing tab submits uploaded CSVs to a SQLite job queue and polls
+it for progress. Jobs are run by a pool of worker threads, either inside the
+Streamlit process or in a standalone worker process, so closing the tab or
+rerunning the script does not abort them. Workers pick the queued job whose
+owner has the fewest running jobs, then the owner served least recently, so
+one user's large batches cannot starve everyone else.
+
+Usage (standalone worker, credentials read from .env):
+    python src/job_queue.py --workers 2
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from backends import DEFAULT_SHORT_CONTENT_TOKENS
+from batch_engine import DEFAULT_MAX_WORKERS, iter_batch, iter_blocks, split_concurrency
+from history_store import make_owner_id
+from job_journal import (
+    JobJournal,
+    journal_dir,
+    journal_name,
+    journaled,
+    journaled_block,
+    make_job_fingerprint,
+    purge_journals
+)
+from rate_limit import RateGovernor
+from response_cache import ResponseCache
+from semantic_cache import SemanticCache
+from template_cache import TemplateCache
+from watsonx_utils import (
+    build_generation_params,
+    load_template_text,
+    setup_watsonx,
+    simplify_block,
+    simplify_content
+)
+
+DEFAULT_QUEUE_PATH = Path(__file__).parent.parent / '.cache' / 'job_queue.sqlite'
+DEFAULT_JOB_FILES_DIR = Path(__file__).parent.parent / '.cache' / 'job_files'
+DEFAULT_JOB_WORKERS = 2
+STALE_JOB_SECONDS = 300
+HEARTBEAT_SECONDS = 10
+DEFAULT_JOB_RETENTION_DAYS = 7
+PURGE_INTERVAL_SECONDS = 3600
+REQUIRED_COLUMNS = ['level', 'subject', 'content']
+ACTIVE_STATUSES = ('queued', 'running')
+
+_JOB_FIELDS = ['id', 'owner', 'name', 'status', 'settings', 'total', 'generations', 'processed', 'failed',
+               'resumed', 'error', 'cancel_requested', 'created_at', 'started_at', 'finished_at', 'heartbeat_at',
+               'claim_id']
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker when the job's owner cancels it"""
+
+
+class JobLost(Exception):
+    """Raised inside a worker whose claim on a job was requeued and taken over by another worker"""
+
+
+class JobQueue:
+    """Durable queue of batch jobs with fair, atomic claiming across worker processes"""
+
+    def __init__(self, path=None, files_dir=None):
+        self.path = Path(path or os.getenv('JOB_QUEUE_PATH') or DEFAULT_QUEUE_PATH)
+        self.files_dir = Path(files_dir or os.getenv('JOB_FILES_DIR') or DEFAULT_JOB_FILES_DIR)
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                settings TEXT NOT NULL,
+                total INTEGER,
+                generations INTEGER,
+                processed INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                resumed INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                heartbeat_at REAL,
+                claim_id TEXT
+            )
+        """)
+        # Queues created before claims were tracked get the column added in place
+        if 'claim_id' not in {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}:
+            try:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN claim_id TEXT")
+            except sqlite3.OperationalError:
+                pass  # another process added it first
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_owner_created ON jobs (owner, created_at)")
+
+    def input_path(self, job_id):
+        return self.files_dir / job_id / 'input.csv'
+
+    def output_path(self, job_id):
+        return self.files_dir / job_id / 'results.csv'
+
+    def submit(self, owner, data, settings, name=''):
+        """Store the uploaded CSV bytes and queue a job for them, returning its id"""
+        job_id = uuid.uuid4().hex[:16]
+        input_path = self.input_path(job_id)
+        input_path.parent.mkdir(parents=True, exist_ok=True)
+        input_path.write_bytes(data)
+
+        # Journals are keyed by input file and settings, so resubmitting an interrupted upload resumes it
+        settings = dict(settings, journal_key=hashlib.sha256(data).hexdigest()[:16])
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, owner, name, status, settings, created_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, owner, name, json.dumps(settings), time.time())
+            )
+        return job_id
+
+    def claim(self, owners=None):
+        """Atomically mark the next fairly scheduled job as running and return it, or None.
+
+        Only jobs belonging to owners are considered when owners is given. The
+        job's claim_id identifies this claim; progress and the final status
+        are only recorded while it still holds the job.
+        """
+        owner_clause = ""
+        args = []
+        if owners is not None:
+            if not owners:
+                return None
+            owner_clause = f"AND owner IN ({', '.join('?' for _ in owners)})"
+            args = list(owners)
+
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two workers never claim the same job
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(f"""
+                    SELECT id FROM jobs AS queued
+                    WHERE status = 'queued' {owner_clause}
+                    ORDER BY
+                        (SELECT COUNT(*) FROM jobs WHERE owner = queued.owner AND status = 'running'),
+                        COALESCE((SELECT MAX(started_at) FROM jobs WHERE owner = queued.owner), 0),
+                        created_at
+                    LIMIT 1
+                """, args).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                now = time.time()
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, heartbeat_at = ?, claim_id = ? WHERE id = ?",
+                    (now, now, uuid.uuid4().hex, row[0])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0])
+
+    def update_progress(self, job_id, claim_id=None, **counts):
+        """Record total/generations/processed/failed/resumed counts and refresh the heartbeat.
+
+        With a claim_id, nothing is recorded unless that claim still holds the
+        running job; returns whether it was recorded.
+        """
+        columns = [name for name in ('total', 'generations', 'processed', 'failed', 'resumed') if name in counts]
+        assignments = ''.join(f"{name} = ?, " for name in columns)
+        claim_clause = "" if claim_id is None else " AND status = 'running' AND claim_id = ?"
+        with self._lock:
+            return self._conn.execute(
+                f"UPDATE jobs SET {assignments}heartbeat_at = ? WHERE id = ?{claim_clause}",
+                [counts[name] for name in columns] + [time.time(), job_id] + ([] if claim_id is None else [claim_id])
+            ).rowcount > 0
+
+    def heartbeat(self, job_id, claim_id=None):
+        """Refresh a running job's heartbeat, returning whether the claim still holds it"""
+        return self.update_progress(job_id, claim_id)
+
+    def finish(self, job_id, status, error=None, claim_id=None):
+        """Record how a job ended, unless claim_id is given and no longer holds the job"""
+        claim_clause = "" if claim_id is None else " AND status = 'running' AND claim_id = ?"
+        with self._lock:
+            finished = self._conn.execute(
+                f"UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?{claim_clause}",
+                [status, None if error is None else str(error), time.time(), job_id]
+                + ([] if claim_id is None else [claim_id])
+            ).rowcount > 0
+        if finished:
+            self._remove_input(job_id)
+        return finished
+
+    def _remove_input(self, job_id):
+        # Only the results are needed once a job has ended; resubmitting the file starts a new job
+        try:
+            self.input_path(job_id).unlink()
+        except FileNotFoundError:
+            pass
+
+    def cancel(self, job_id, owner):
+        """Cancel a queued job immediately, or ask the worker running it to stop"""
+        with self._lock:
+            cancelled = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? "
+                "WHERE id = ? AND owner = ? AND status = 'queued'",
+                (time.time(), job_id, owner)
+            ).rowcount > 0
+            self._conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND owner = ? AND status = 'running'",
+                (job_id, owner)
+            )
+        if cancelled:
+            self._remove_input(job_id)
+
+    def is_cancel_requested(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def requeue_stale(self, timeout=STALE_JOB_SECONDS):
+        """Return running jobs whose worker stopped sending heartbeats to the queue"""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = 'queued' WHERE status = 'running' AND heartbeat_at < ?",
+                (time.time() - timeout,)
+            ).rowcount
+
+    def purge_finished(self, max_age_seconds):
+        """Delete jobs that ended more than max_age_seconds ago, with their files, returning how many"""
+        cutoff = time.time() - max_age_seconds
+        with self._lock:
+            job_ids = [row[0] for row in self._conn.execute(
+                "SELECT id FROM jobs WHERE status NOT IN ('queued', 'running') AND finished_at < ?", (cutoff,)
+            ).fetchall()]
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+        for job_id in job_ids:
+            shutil.rmtree(self.files_dir / job_id, ignore_errors=True)
+        return len(job_ids)
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(_JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else self._to_job(row)
+
+    def list_jobs(self, owner, limit=20):
+        """Most recent jobs of one owner, newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_JOB_FIELDS)} FROM jobs WHERE owner = ? ORDER BY created_at DESC LIMIT ?",
+                (owner, limit)
+            ).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def _to_job(self, row):
+        job = dict(zip(_JOB_FIELDS, row))
+        job['settings'] = json.loads(job['settings'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+
+def run_job(queue, job, backend, renderer, params, response_cache=None, governor=None,
+            progress_interval=1.0, semantic_cache=None, live_results=None):
+    """Simplify every row of a claimed job's input and write its results CSV.
+
+    While the job runs its ResultsStore is kept in live_results under the job
+    ID, if given, so finished rows can be shown before the CSV is written.
+    Raises JobCancelled if the owner cancels the job while it runs, and
+    JobLost if another worker has taken it over.
+    """
+    # pandas and NumPy are only needed once a job runs, so importing this module stays cheap
+    import pandas as pd
+    from batch_runner import expand_levels
+    from dedup import find_duplicates
+    from results_store import ResultsStore
+
+    settings = job['settings']
+
+    def report(**counts):
+        # A worker whose claim was taken over stops before writing anything else
+        if not queue.update_progress(job['id'], job.get('claim_id'), **counts):
+            raise JobLost(job['id'])
+
+    df = pd.read_csv(queue.input_path(job['id']), dtype=str, keep_default_na=False)
+    if not all(col in df.columns for col in REQUIRED_COLUMNS):
+        raise ValueError("CSV must contain columns: level, subject, content")
+    records = list(expand_levels(df[REQUIRED_COLUMNS].to_dict('records')))
+
+    # Generate each group of duplicate rows once and fan the result back out
+    if settings.get('merge_duplicates', True):
+        representatives = find_duplicates(records, near_threshold=settings.get('near_threshold'))
+    else:
+        representatives = list(range(len(records)))
+    duplicates = {}
+    for index, representative in enumerate(representatives):
+        duplicates.setdefault(representative, []).append(index)
+    unique_indexes = sorted(duplicates)
+    report(total=len(records), generations=len(unique_indexes))
+    # Results are filled into columns as rows finish instead of being collected per row and copied at the end
+    store = ResultsStore.from_records(records)
+    if live_results is not None:
+        live_results[job['id']] = store
+
+    def simplify_row(row):
+        return simplify_content(
+            backend,
+            renderer,
+            row['level'],
+            row['subject'],
+            row['content'],
+            params,
+            response_cache=response_cache,
+            governor=governor,
+            semantic_cache=semantic_cache
+        )
+
+    # One journal per input and generation settings, so jobs with other settings never touch it
+    fingerprint = make_job_fingerprint(renderer.text, backend.model_id, params)
+    journal = JobJournal(journal_dir() / journal_name(settings['journal_key'], fingerprint), fingerprint=fingerprint)
+    items = [(index, records[index]) for index in unique_indexes]
+    concurrency = settings.get('concurrency', DEFAULT_MAX_WORKERS)
+    block_size = settings.get('block_size') or 1
+    if block_size > 1:
+        # Send rows as multi-prompt generate_text calls instead of one call per row
+        blocks_in_flight, per_block = split_concurrency(concurrency, block_size)
+
+        def simplify_rows(rows):
+            return simplify_block(backend, renderer, rows, params, response_cache=response_cache,
+                                  governor=governor, concurrency_limit=per_block, semantic_cache=semantic_cache)
+
+        outcomes_iter = iter_blocks(items, journaled_block(simplify_rows, journal), block_size,
+                                    max_workers=blocks_in_flight, ordered=False)
+    else:
+        outcomes_iter = iter_batch(items, journaled(simplify_row, journal), max_workers=concurrency, ordered=False)
+
+    counts = {'processed': 0, 'failed': 0, 'resumed': 0}
+    reported_at = time.monotonic()
+    try:
+        for outcome in outcomes_iter:
+            # Failed rows are kept with their error so none are silently dropped
+            for index in duplicates[outcome.row[0]]:
+                if outcome.ok:
+                    store.set(index, outcome.result[0])
+                else:
+                    store.set(index, error=outcome.error)
+            counts['processed'] += 1
+            counts['failed'] += 0 if outcome.ok else 1
+            counts['resumed'] += 1 if outcome.ok and outcome.result[1] else 0
+
+            if time.monotonic() - reported_at >= progress_interval:
+                reported_at = time.monotonic()
+                report(**counts)
+                if queue.is_cancel_requested(job['id']):
+                    raise JobCancelled(job['id'])
+    finally:
+        # Closing the iterator stops queued rows and waits for in-flight ones before the journal goes away
+        outcomes_iter.close()
+        journal.close()
+    report(**counts)
+
+    # Readability is scored a slice of rows at a time while the CSV is written
+    store.write_csv(queue.output_path(job['id']))
+    if live_results is not None:
+        live_results.pop(job['id'], None)
+    store.close()
+    return counts
+
+
+class JobWorkerPool:
+    """Worker threads that claim jobs from a JobQueue and run them.
+
+    A pool only runs jobs for owners registered with it, since the clients
+    holding each owner's credentials are kept in memory and never written to
+    the queue. Once an hour it deletes jobs, result files and journals older
+    than retention_days (JOB_RETENTION_DAYS, default 7; 0 keeps them).
+    """
+
+    def __init__(self, queue, template_cache, num_workers=None, response_cache=None, governor=None,
+                 poll_interval=1.0, semantic_cache=None, retention_days=None):
+        self.queue = queue
+        self.template_cache = template_cache
+        self.num_workers = num_workers or int(os.getenv('JOB_WORKERS') or DEFAULT_JOB_WORKERS)
+        self.response_cache = response_cache
+        self.governor = governor
+        self.semantic_cache = semantic_cache
+        self.poll_interval = poll_interval
+        self.retention_days = float(
+            retention_days if retention_days is not None
+            else os.getenv('JOB_RETENTION_DAYS') or DEFAULT_JOB_RETENTION_DAYS
+        )
+        self._purged_at = None
+        self._purge_lock = threading.Lock()
+        self._backends = {}
+        self._backends_lock = threading.Lock()
+        self._live_results = {}
+        self._stop = threading.Event()
+        self._threads = []
+
+    def register(self, owner, backend, prompt_mgr):
+        """Make this pool run the owner's jobs with the given clients"""
+        with self._backends_lock:
+            self._backends[owner] = (backend, prompt_mgr)
+
+    def live_results(self, job_id):
+        """ResultsStore of a job this pool is running, or None"""
+        return self._live_results.get(job_id)
+
+    def purge(self):
+        """Delete finished jobs and journals past the retention period, returning how many of each"""
+        if not self.retention_days:
+            return 0, 0
+        max_age = self.retention_days * 86400
+        return self.queue.purge_finished(max_age), purge_journals(journal_dir(), max_age)
+
+    def _purge_if_due(self):
+        with self._purge_lock:
+            if self._purged_at is not None and time.monotonic() - self._purged_at < PURGE_INTERVAL_SECONDS:
+                return
+            self._purged_at = time.monotonic()
+        self.purge()
+
+    def start(self):
+        if self._threads:
+            return self
+        for number in range(self.num_workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self):
+        while not self._stop.is_set():
+            with self._backends_lock:
+                owners = list(self._backends)
+            self.queue.requeue_stale()
+            self._purge_if_due()
+            job = self.queue.claim(owners)
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self.run(job)
+
+    def _keep_alive(self, job, stop):
+        # Heartbeats come from a timer, so a job whose rows are slow is not mistaken for a dead worker
+        while not stop.wait(HEARTBEAT_SECONDS):
+            if not self.queue.heartbeat(job['id'], job.get('claim_id')):
+                return
+
+    def run(self, job):
+        """Run one claimed job to completion and record how it ended"""
+        settings = job['settings']
+        with self._backends_lock:
+            backend, prompt_mgr = self._backends[job['owner']]
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(target=self._keep_alive, args=(job, stop_heartbeat),
+                                     name=f"job-heartbeat-{job['id']}", daemon=True)
+        heartbeat.start()
+        try:
+            renderer = self.template_cache.get(
+                settings['template_id'],
+                lambda asset_id: load_template_text(prompt_mgr, asset_id)
+            )
+            params = build_generation_params(settings['max_tokens'], settings['temperature'],
+                                             settings.get('decoding_method', 'greedy'))
+            run_job(
+                self.queue,
+                job,
+                backend,
+                renderer,
+                params,
+                response_cache=self.response_cache if settings.get('use_cache', True) else None,
+                # Jobs yield to interactive generations and share the batch budget fairly between owners
+                governor=self.governor.for_batch(job['owner']) if self.governor is not None else None,
+                semantic_cache=self.semantic_cache if settings.get('use_semantic_cache') else None,
+                live_results=self._live_results
+            )
+        except JobLost:
+            pass  # the worker that took the job over records how it ends
+        except JobCancelled:
+            self.queue.finish(job['id'], 'cancelled', claim_id=job.get('claim_id'))
+        except Exception as e:
+            self.queue.finish(job['id'], 'failed', e, claim_id=job.get('claim_id'))
+        else:
+            self.queue.finish(job['id'], 'done', claim_id=job.get('claim_id'))
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
+            # Cancelled and failed jobs leave no results CSV, so their rows are dropped with the store
+            self._live_results.pop(job['id'], None)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run queued batch jobs submitted from the Streamlit app")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"Jobs run at the same time (defaults to JOB_WORKERS or {DEFAULT_JOB_WORKERS})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    load_dotenv(dotenv_path=Path(__file__).parent.parent / '.env')
+
+    api_key = os.getenv('IBM_API_KEY')
+    project_id = os.getenv('IBM_PROJECT_ID')
+    region = os.getenv('IBM_REGION') or 'us-south'
+    if not (api_key and project_id):
+        print("❌ IBM_API_KEY and IBM_PROJECT_ID must be set", file=sys.stderr)
+        return 2
+
+    _, backend, prompt_mgr = setup_watsonx(
+        api_key, project_id, region,
+        short_model_id=os.getenv('SHORT_MODEL_ID') or None,
+        max_short_tokens=int(os.getenv('SHORT_CONTENT_TOKENS') or DEFAULT_SHORT_CONTENT_TOKENS)
+    )
+    pool = JobWorkerPool(
+        JobQueue(),
+        TemplateCache(),
+        num_workers=args.workers,
+        response_cache=ResponseCache(),
+        governor=RateGovernor.from_env(),
+        semantic_cache=SemanticCache()
+    )
+    pool.register(make_owner_id(api_key), backend, prompt_mgr)
+    pool.start()
+    print(f"👷 {pool.num_workers} job workers waiting for jobs in {pool.queue.path}", file=sys.stderr)
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pool.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
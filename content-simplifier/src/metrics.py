@@ -0,0 +1,222 @@
+"""In-process request metrics with a Prometheus text exporter.
+
+Every template load and generation call is recorded in REGISTRY, which the
+Streamlit Metrics tab renders and the headless runner can expose over HTTP.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+RESERVOIR_SIZE = 2048
+
+
+def percentile(sorted_values, fraction, default=None):
+    """Nearest-rank percentile of already sorted values, or default when there are none"""
+    if not sorted_values:
+        return default
+    position = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[position]
+
+
+class Histogram:
+    """Cumulative bucket counts plus a reservoir of recent samples for percentiles"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def percentiles(self, fractions=(0.5, 0.95, 0.99)):
+        values = sorted(self.recent)
+        return [percentile(values, fraction) for fraction in fractions]
+
+
+class MetricsRegistry:
+    """Thread-safe collection of labelled counters and histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+
+    def inc(self, name, amount=1, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, ('counter', help_text))
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, ('histogram', help_text))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def track(self, operation):
+        """Time a block and count it by outcome and error class"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self._finish(operation, started, 'error', type(e).__name__)
+            raise
+        self._finish(operation, started, 'ok', '')
+
+    def _finish(self, operation, started, outcome, error_class):
+        self.observe('simplifier_operation_duration_seconds', time.perf_counter() - started,
+                     help_text="Duration of Watsonx.ai operations", operation=operation)
+        self.inc('simplifier_operations_total', help_text="Watsonx.ai operations by outcome",
+                 operation=operation, outcome=outcome, error_class=error_class)
+
+    def record_tokens(self, operation, input_tokens, output_tokens):
+        self.observe('simplifier_input_tokens', input_tokens, buckets=TOKEN_BUCKETS,
+                     help_text="Estimated prompt tokens per generation", operation=operation)
+        self.observe('simplifier_output_tokens', output_tokens, buckets=TOKEN_BUCKETS,
+                     help_text="Estimated generated tokens per generation", operation=operation)
+
+    def record_retry(self, operation, error_class):
+        self.inc('simplifier_retries_total', help_text="Retried Watsonx.ai calls",
+                 operation=operation, error_class=error_class)
+
+    def summary(self):
+        """One row per operation with call counts and latency percentiles, for the dashboard"""
+        with self._lock:
+            counters = dict(self._counters)
+            durations = {
+                dict(labels)['operation']: histogram
+                for (name, labels), histogram in self._histograms.items()
+                if name == 'simplifier_operation_duration_seconds'
+            }
+            rows = []
+            for operation, histogram in sorted(durations.items()):
+                p50, p95, p99 = histogram.percentiles()
+                calls = errors = retries = 0
+                for (name, labels), value in counters.items():
+                    labels = dict(labels)
+                    if labels.get('operation') != operation:
+                        continue
+                    if name == 'simplifier_operations_total':
+                        calls += value
+                        errors += value if labels.get('outcome') == 'error' else 0
+                    elif name == 'simplifier_retries_total':
+                        retries += value
+                rows.append({
+                    'operation': operation,
+                    'calls': calls,
+                    'errors': errors,
+                    'retries': retries,
+                    'mean_s': histogram.sum / histogram.count if histogram.count else None,
+                    'p50_s': p50,
+                    'p95_s': p95,
+                    'p99_s': p99
+                })
+        return rows
+
+    def error_classes(self):
+        """Counts of failed operations by (operation, error class)"""
+        with self._lock:
+            return {
+                (dict(labels)['operation'], dict(labels)['error_class']): value
+                for (name, labels), value in self._counters.items()
+                if name == 'simplifier_operations_total' and dict(labels).get('outcome') == 'error'
+            }
+
+    def histogram_buckets(self, name, **labels):
+        """Non-cumulative (upper bound, count) pairs for one histogram, or [] if it has no samples"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                return []
+            bounds = [str(bound) for bound in histogram.buckets] + ['+Inf']
+            return list(zip(bounds, histogram.counts))
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in sorted(self._help.items()):
+                if help_text:
+                    lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+                if kind == 'counter':
+                    for (metric, labels), value in sorted(self._counters.items()):
+                        if metric == name:
+                            lines.append(f"{name}{_format_labels(labels)} {value}")
+                    continue
+
+                for (metric, labels), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                        cumulative += count
+                        bucket_labels = labels + (('le', str(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._help.clear()
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels) + "}"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def start_metrics_server(port, registry=REGISTRY, host="0.0.0.0"):
+    """Serve registry.to_prometheus() at /metrics from a background thread"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,292 @@
+"""Shared rate governor for Watsonx.ai generation calls.
+
+Requests pass through token buckets for requests and tokens per minute and an
+AIMD concurrency limit that halves on throttling and grows back while calls
+succeed. Retryable failures (429, transient 5xx, connection errors) are
+retried with exponential backoff and full jitter.
+
+Calls are scheduled by priority class: interactive calls (Single Content)
+go ahead of batch calls (background jobs), batch calls from different owners
+take turns, and batch work never holds more than a share of the concurrency
+limit, so a large job does not slow down everyone else's clicks.
+"""
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import REGISTRY
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+DEFAULT_REQUESTS_PER_MINUTE = 480
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BATCH_SHARE = 0.75
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+
+_STATUS_IN_MESSAGE = re.compile(r'[Ss]tatus code:?\s*(\d{3})')
+
+
+def status_code_of(error):
+    """Best-effort HTTP status code of an SDK or transport error"""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is None:
+        match = _STATUS_IN_MESSAGE.search(str(error))
+        status = int(match.group(1)) if match else None
+    return status
+
+
+def is_throttled(error):
+    return status_code_of(error) == 429
+
+
+def is_retryable(error):
+    if status_code_of(error) in RETRYABLE_STATUS_CODES:
+        return True
+    name = type(error).__name__
+    return isinstance(error, (ConnectionError, TimeoutError)) or 'Timeout' in name or 'Connect' in name
+
+
+class TokenBucket:
+    """Blocking token bucket refilled continuously at rate_per_minute.
+
+    The burst capacity defaults to one second's worth of tokens.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self._interactive_waiting = 0
+
+    def acquire(self, amount=1, priority=INTERACTIVE):
+        """Block until amount tokens are available, then take them.
+
+        Requests larger than the burst capacity wait for a full bucket and
+        leave it in debt, so the long-run rate still holds. Batch requests
+        leave tokens to interactive requests that are waiting for them.
+        """
+        needed = min(amount, self.capacity)
+        waiting = False
+        try:
+            while True:
+                with self._lock:
+                    now = self._clock()
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= needed and (priority == INTERACTIVE or not self._interactive_waiting):
+                        self._tokens -= amount
+                        return
+                    if priority == INTERACTIVE and not waiting:
+                        self._interactive_waiting += 1
+                        waiting = True
+                    # Batch requests held back for an interactive one check again shortly
+                    wait = (needed - self._tokens) / self.rate if self._tokens < needed else 0.01
+                time.sleep(wait)
+        finally:
+            if waiting:
+                with self._lock:
+                    self._interactive_waiting -= 1
+
+
+class AdaptiveConcurrencyLimit:
+    """AIMD limit on in-flight calls: halve on throttling, add one per limit's worth of successes.
+
+    Waiting calls are admitted by priority. Interactive calls go first, in
+    arrival order. Batch calls go next, starting with the owner that has the
+    fewest batch calls in flight, and never take more than batch_share of
+    the limit, so a slot frees up quickly for the next interactive call.
+    """
+
+    def __init__(self, max_limit=DEFAULT_MAX_CONCURRENCY, initial=None, min_limit=1,
+                 batch_share=DEFAULT_BATCH_SHARE):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(initial or max_limit)
+        self.batch_share = batch_share
+        self.in_flight = 0
+        self.batch_in_flight = 0
+        self._owner_in_flight = {}
+        self._waiting = []
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+
+    @property
+    def waiting(self):
+        return len(self._waiting)
+
+    def batch_limit(self):
+        """Most batch calls allowed in flight at the current limit"""
+        return max(1, int(int(self.limit) * self.batch_share))
+
+    def _next_ticket(self):
+        for ticket in self._waiting:
+            if ticket[1] == INTERACTIVE:
+                return ticket
+        if not self._waiting or self.batch_in_flight >= self.batch_limit():
+            return None
+        return min(self._waiting, key=lambda ticket: (self._owner_in_flight.get(ticket[2], 0), ticket[0]))
+
+    def acquire(self, priority=INTERACTIVE, owner=None, slots=1):
+        """Wait for a free slot, then take up to slots of them, returning how many were taken.
+
+        A multi-prompt call asks for one slot per request it will have in
+        flight and sends no more requests at once than it was granted.
+        """
+        with self._condition:
+            ticket = (next(self._tickets), priority, owner)
+            self._waiting.append(ticket)
+            try:
+                while self.in_flight >= int(self.limit) or self._next_ticket() is not ticket:
+                    self._condition.wait()
+            finally:
+                self._waiting.remove(ticket)
+            granted = min(slots, int(self.limit) - self.in_flight)
+            if priority == BATCH:
+                granted = min(granted, self.batch_limit() - self.batch_in_flight)
+            granted = max(1, granted)
+            self.in_flight += granted
+            if priority == BATCH:
+                self.batch_in_flight += granted
+                self._owner_in_flight[owner] = self._owner_in_flight.get(owner, 0) + granted
+            # The call behind this one may fit as well
+            self._condition.notify_all()
+            return granted
+
+    def release(self, priority=INTERACTIVE, owner=None, slots=1):
+        with self._condition:
+            self.in_flight -= slots
+            if priority == BATCH:
+                self.batch_in_flight -= slots
+                self._owner_in_flight[owner] -= slots
+                if not self._owner_in_flight[owner]:
+                    del self._owner_in_flight[owner]
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            previous = int(self.limit)
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            if int(self.limit) > previous:
+                self._condition.notify_all()
+
+    def on_throttle(self):
+        with self._condition:
+            self.limit = max(self.min_limit, self.limit / 2)
+
+
+class RateGovernor:
+    """Rate limits, adaptive concurrency and retries in front of generate_text"""
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=None,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, max_retries=DEFAULT_MAX_RETRIES,
+                 base_delay=0.5, max_delay=30.0, seed=None, batch_share=DEFAULT_BATCH_SHARE):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrencyLimit(max_concurrency, batch_share=batch_share)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_env(cls, requests_per_minute=None):
+        """Build a governor from WATSONX_* environment variables, with an optional request rate override"""
+        def env_int(name, default):
+            value = os.getenv(name)
+            return int(value) if value else default
+
+        if requests_per_minute is None:
+            requests_per_minute = env_int('WATSONX_REQUESTS_PER_MINUTE', DEFAULT_REQUESTS_PER_MINUTE)
+        return cls(
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=env_int('WATSONX_TOKENS_PER_MINUTE', None),
+            max_concurrency=env_int('WATSONX_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY),
+            max_retries=env_int('WATSONX_MAX_RETRIES', DEFAULT_MAX_RETRIES),
+            batch_share=float(os.getenv('WATSONX_BATCH_SHARE') or DEFAULT_BATCH_SHARE)
+        )
+
+    def backoff(self, attempt):
+        """Exponential backoff with full jitter for the given retry attempt (0-based)"""
+        return self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def for_batch(self, owner):
+        """This governor as seen by one owner's batch work"""
+        return ScheduledGovernor(self, BATCH, owner)
+
+    @contextmanager
+    def limit(self, tokens=1, requests=1, priority=INTERACTIVE, owner=None, slots=1):
+        """Hold concurrency slots and rate budget for one call, without retrying.
+
+        A multi-prompt call counts as requests requests against the request
+        rate and asks for up to slots concurrency slots, one per request it
+        sends at once; the number granted is yielded.
+        """
+        started = time.perf_counter()
+        granted = self.concurrency.acquire(priority, owner, slots)
+        REGISTRY.observe('simplifier_scheduler_wait_seconds', time.perf_counter() - started,
+                         help_text="Time generation calls waited for a concurrency slot", priority=priority)
+        try:
+            if self.request_bucket is not None:
+                self.request_bucket.acquire(requests, priority)
+            if self.token_bucket is not None:
+                self.token_bucket.acquire(tokens, priority)
+            yield granted
+        except Exception as e:
+            if is_throttled(e):
+                self.concurrency.on_throttle()
+            raise
+        else:
+            self.concurrency.on_success()
+        finally:
+            self.concurrency.release(priority, owner, granted)
+
+    def call(self, func, tokens=1, operation='generate_text', priority=INTERACTIVE, owner=None):
+        """Run func under the governor's limits, retrying retryable failures"""
+        attempt = 0
+        while True:
+            try:
+                with self.limit(tokens, priority=priority, owner=owner):
+                    return func()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                REGISTRY.record_retry(operation, type(e).__name__)
+                time.sleep(self.backoff(attempt))
+                attempt += 1
+
+    def stats(self):
+        return {
+            'concurrency_limit': int(self.concurrency.limit),
+            'in_flight': self.concurrency.in_flight,
+            'batch_limit': self.concurrency.batch_limit(),
+            'batch_in_flight': self.concurrency.batch_in_flight,
+            'waiting': self.concurrency.waiting
+        }
+
+
+class ScheduledGovernor:
+    """A RateGovernor whose calls all run with one priority class on behalf of one owner"""
+
+    def __init__(self, governor, priority, owner):
+        self.governor = governor
+        self.priority = priority
+        self.owner = owner
+
+    def limit(self, tokens=1, requests=1, slots=1):
+        return self.governor.limit(tokens, requests, priority=self.priority, owner=self.owner, slots=slots)
+
+    def call(self, func, tokens=1, operation='generate_text'):
+        return self.governor.call(func, tokens, operation, priority=self.priority, owner=self.owner)
+
+    def stats(self):
+        return self.governor.stats()
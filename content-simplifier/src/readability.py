@@ -0,0 +1,68 @@
+"""Vectorized readability scores for simplified output.
+
+Scores are computed for whole columns at once with pandas string methods and
+NumPy arithmetic, so batch results and history exports of 100k rows are
+scored in seconds rather than looping over rows in Python.
+"""
+import numpy as np
+import pandas as pd
+
+READABILITY_COLUMNS = ['fk_grade', 'avg_sentence_length', 'compression_ratio']
+
+_WORD = r"[A-Za-z0-9]+(?:'[A-Za-z]+)?"
+_SENTENCE_END = r"[.!?]+(?=\s|$)"
+_VOWEL_GROUP = r"[aeiouy]+"
+# A trailing silent "e" (make, stone) adds a vowel group but not a syllable, as long as the word has
+# another vowel group to carry one (unlike the, he); "-le" (table) still counts
+_SILENT_E = r"[aeiouy][b-df-hj-np-tv-xz]*?[b-df-hj-kmnp-tv-xz]e\b"
+# Words without a vowel group (numbers, initialisms) still have a syllable
+_NO_VOWEL_WORD = r"(?<![a-z0-9'])[b-df-hj-np-tv-xz0-9]+(?![a-z0-9'])"
+
+
+def _as_text(texts):
+    return pd.Series(texts, dtype=object).fillna('').astype(str)
+
+
+def readability_scores(texts, originals=None):
+    """Readability of each text as a DataFrame with READABILITY_COLUMNS.
+
+    Syllables are estimated from vowel groups, so grades are approximate but
+    comparable between rows. compression_ratio is the text's length over the
+    matching original's length. Scores are NaN for empty texts, such as
+    failed rows, and compression_ratio is NaN when originals is not given.
+    """
+    texts = _as_text(texts)
+    lowered = texts.str.lower()
+
+    words = texts.str.count(_WORD).to_numpy(dtype=float)
+    sentences = np.maximum(texts.str.count(_SENTENCE_END).to_numpy(dtype=float), 1.0)
+    syllables = (lowered.str.count(_VOWEL_GROUP) - lowered.str.count(_SILENT_E)
+                 + lowered.str.count(_NO_VOWEL_WORD)).to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        words_per_sentence = np.where(words > 0, words / sentences, np.nan)
+        syllables_per_word = np.where(words > 0, syllables / words, np.nan)
+        fk_grade = 0.39 * words_per_sentence + 11.8 * syllables_per_word - 15.59
+
+        compression = np.full(len(texts), np.nan)
+        if originals is not None:
+            original_lengths = _as_text(originals).str.len().to_numpy(dtype=float)
+            compression = np.where((original_lengths > 0) & (words > 0),
+                                   texts.str.len().to_numpy(dtype=float) / original_lengths, np.nan)
+
+    return pd.DataFrame({
+        'fk_grade': np.round(fk_grade, 2),
+        'avg_sentence_length': np.round(words_per_sentence, 2),
+        'compression_ratio': np.round(compression, 3)
+    }, index=texts.index)
+
+
+def add_readability_columns(df, text_column='simplified_content', original_column='original_content'):
+    """Return a copy of df with readability columns for text_column appended"""
+    scored = df.copy()
+    originals = df[original_column] if original_column in df.columns else None
+    scores = readability_scores(df[text_column].reset_index(drop=True),
+                                None if originals is None else originals.reset_index(drop=True))
+    for column in READABILITY_COLUMNS:
+        scored[column] = scores[column].to_numpy()
+    return scored
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent / '.cache' / 'responses.sqlite'
+DEFAULT_MAX_ENTRIES = 10000
+
+
+def _param_value(value):
+    return getattr(value, 'value', str(value))
+
+
+def is_cacheable(params):
+    """Only greedy decoding is deterministic, so sampled output is never cached"""
+    return _param_value(params.get('decoding_method', 'greedy')) == 'greedy'
+
+
+def make_cache_key(template_text, level, subject, content, model_id, params):
+    """Content-addressed key for one generation request"""
+    payload = json.dumps({
+        'template': template_text,
+        'level': level,
+        'subject': subject,
+        'content': content,
+        'model_id': model_id,
+        'params': {str(name): _param_value(value) for name, value in params.items()}
+    }, sort_keys=True, default=_param_value)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed generation cache with least-recently-used eviction"""
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = Path(path or os.getenv('RESPONSE_CACHE_PATH') or DEFAULT_CACHE_PATH)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss"""
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key, response):
+        """Store a response, evicting the least recently used entries past max_entries"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            overflow = self._count() - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                    (overflow,)
+                )
+
+    def clear(self):
+        """Remove every cached response and reset the counters"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            entries = self._count()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries
+        }
+
+    def _count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
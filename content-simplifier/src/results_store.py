@@ -0,0 +1,179 @@
+"""Column-oriented store for batch results.
+
+Rows are kept as parallel columns rather than one dict per row: level and
+subject as categoricals, original content as a reference to the caller's
+list (looked up by row ID, never copied), and each row's output filled in as
+it finishes. Once outputs held in memory pass max_memory_bytes they are moved
+to a SQLite file, so a large batch does not keep growing the process. Pages
+and CSV exports are built on demand, a slice of rows at a time.
+"""
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from readability import readability_scores
+
+RESULT_COLUMNS = ['level', 'subject', 'original_content', 'simplified_content', 'error']
+DEFAULT_MAX_MEMORY_MB = 16
+EXPORT_BATCH_ROWS = 5000
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class ResultsStore:
+    """Batch results for a fixed list of input rows, filled in as rows finish"""
+
+    def __init__(self, levels, subjects, contents, max_memory_bytes=None):
+        self._levels = pd.Categorical(levels)
+        self._subjects = pd.Categorical(subjects)
+        self._contents = contents
+        size = len(contents)
+        # Simplified text, or the error message for failed rows; None until done or once spilled
+        self._outputs = np.full(size, None, dtype=object)
+        self._done = np.zeros(size, dtype=bool)
+        self._failed = np.zeros(size, dtype=bool)
+        self._spilled = np.zeros(size, dtype=bool)
+        self._memory_bytes = 0
+        self.max_memory_bytes = max_memory_bytes or int(
+            float(os.getenv('RESULTS_MEMORY_LIMIT_MB') or DEFAULT_MAX_MEMORY_MB) * 1024 * 1024
+        )
+        self._conn = None
+        self._spill_path = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_records(cls, records, **kwargs):
+        """Build a store for dicts with level, subject and content keys"""
+        return cls([record['level'] for record in records], [record['subject'] for record in records],
+                   [record['content'] for record in records], **kwargs)
+
+    def __len__(self):
+        return len(self._contents)
+
+    @property
+    def completed(self):
+        return int(self._done.sum())
+
+    @property
+    def failed(self):
+        return int(self._failed.sum())
+
+    @property
+    def spilled(self):
+        return int(self._spilled.sum())
+
+    def set(self, row_id, simplified=None, error=None):
+        """Record a finished row: its simplified text, or the error it failed with"""
+        output = str(error) if error is not None else simplified or ''
+        with self._lock:
+            if self._done[row_id] and not self._spilled[row_id]:
+                self._memory_bytes -= sys.getsizeof(self._outputs[row_id])
+            self._outputs[row_id] = output
+            self._done[row_id] = True
+            self._failed[row_id] = error is not None
+            self._spilled[row_id] = False
+            self._memory_bytes += sys.getsizeof(output)
+            if self._memory_bytes > self.max_memory_bytes:
+                self._spill()
+
+    def _spill(self):
+        if self._conn is None:
+            handle, self._spill_path = tempfile.mkstemp(prefix='results_', suffix='.sqlite')
+            os.close(handle)
+            weakref.finalize(self, _remove_file, self._spill_path)
+            self._conn = sqlite3.connect(self._spill_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=OFF")
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.execute("CREATE TABLE outputs (row_id INTEGER PRIMARY KEY, output TEXT NOT NULL)")
+
+        in_memory = np.flatnonzero(self._done & ~self._spilled)
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO outputs (row_id, output) VALUES (?, ?)",
+                                   ((int(row_id), self._outputs[row_id]) for row_id in in_memory))
+        self._outputs[in_memory] = None
+        self._spilled[in_memory] = True
+        self._memory_bytes = 0
+
+    def _outputs_for(self, row_ids):
+        outputs = self._outputs[row_ids]
+        spilled = self._spilled[row_ids]
+        if spilled.any():
+            wanted = row_ids[spilled]
+            found = dict(self._conn.execute(
+                "SELECT row_id, output FROM outputs WHERE row_id BETWEEN ? AND ?",
+                (int(wanted[0]), int(wanted[-1]))
+            ).fetchall())
+            outputs[spilled] = [found[int(row_id)] for row_id in wanted]
+        return outputs
+
+    def frame(self, row_ids):
+        """DataFrame of RESULT_COLUMNS and readability scores for sorted row IDs, indexed by row ID"""
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        with self._lock:
+            outputs = self._outputs_for(row_ids)
+            done = self._done[row_ids]
+            failed = self._failed[row_ids]
+        ok = done & ~failed
+        originals = [self._contents[row_id] for row_id in row_ids]
+        frame = pd.DataFrame({
+            'level': self._levels[row_ids],
+            'subject': self._subjects[row_ids],
+            'original_content': originals,
+            'simplified_content': np.where(ok, outputs, ''),
+            'error': np.where(failed, outputs, '')
+        }, index=pd.Index(row_ids, name='row'))
+        scores = readability_scores(frame['simplified_content'].reset_index(drop=True), originals)
+        for column in scores.columns:
+            frame[column] = scores[column].to_numpy()
+        return frame
+
+    def completed_ids(self):
+        """Row IDs of finished rows, in input order"""
+        with self._lock:
+            return np.flatnonzero(self._done)
+
+    def page(self, offset, limit, completed_only=True):
+        """One page of rows, by default counting only finished rows"""
+        row_ids = self.completed_ids() if completed_only else np.arange(len(self))
+        return self.frame(row_ids[offset:offset + limit])
+
+    def iter_frames(self, batch_size=EXPORT_BATCH_ROWS, completed_only=False):
+        """Yield the results as DataFrames of at most batch_size rows, in input order"""
+        row_ids = self.completed_ids() if completed_only else np.arange(len(self))
+        for start in range(0, len(row_ids), batch_size):
+            yield self.frame(row_ids[start:start + batch_size])
+
+    def write_csv(self, path_or_buffer, completed_only=False):
+        """Write the results as CSV a batch at a time, with a header even when empty"""
+        header = True
+        for frame in self.iter_frames(completed_only=completed_only):
+            frame.to_csv(path_or_buffer, index=False, header=header, mode='w' if header else 'a')
+            header = False
+        if header:
+            self.frame([]).to_csv(path_or_buffer, index=False)
+
+    def to_csv_bytes(self, completed_only=False):
+        """CSV of the results, for download buttons that build their file when clicked"""
+        buffer = io.StringIO()
+        self.write_csv(buffer, completed_only=completed_only)
+        return buffer.getvalue().encode('utf-8')
+
+    def close(self):
+        """Drop the spill file, if any"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                _remove_file(self._spill_path)
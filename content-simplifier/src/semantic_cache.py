@@ -0,0 +1,173 @@
+"""Similarity cache for requests worded differently from earlier ones.
+
+Content is embedded as a hashed TF-IDF vector of word unigrams and bigrams.
+Vectors are kept in a NumPy matrix for brute-force cosine search and in
+SQLite, so the index survives restarts and grows one row at a time.
+Entries are grouped by a topic key covering the template, model, generation
+settings, level and subject, and only entries with the same topic are
+compared.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from dedup import normalize_text
+from metrics import REGISTRY
+from response_cache import make_cache_key
+
+DEFAULT_SEMANTIC_CACHE_PATH = Path(__file__).parent.parent / '.cache' / 'semantic_cache.sqlite'
+DEFAULT_SIMILARITY_THRESHOLD = 0.9
+DEFAULT_MAX_ENTRIES = 20000
+VECTOR_DIM = 512
+
+
+def make_topic_key(template_text, level, subject, model_id, params):
+    """Key of the group of entries a request may be answered from"""
+    return make_cache_key(template_text, normalize_text(level), normalize_text(subject), '', model_id, params)
+
+
+def term_frequencies(text, dim=VECTOR_DIM):
+    """Sublinear term frequencies of hashed word unigrams and bigrams"""
+    words = normalize_text(text).split()
+    terms = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+    vector = np.zeros(dim, dtype=np.float32)
+    for term in terms:
+        vector[zlib.crc32(term.encode('utf-8')) % dim] += 1
+    nonzero = vector > 0
+    vector[nonzero] = 1 + np.log(vector[nonzero])
+    return vector
+
+
+class SemanticCache:
+    """Nearest-neighbour lookup of earlier responses by TF-IDF cosine similarity"""
+
+    def __init__(self, path=None, threshold=None, max_entries=None, dim=VECTOR_DIM):
+        self.path = Path(path or os.getenv('SEMANTIC_CACHE_PATH') or DEFAULT_SEMANTIC_CACHE_PATH)
+        self.threshold = threshold or float(os.getenv('SEMANTIC_CACHE_THRESHOLD') or DEFAULT_SIMILARITY_THRESHOLD)
+        self.max_entries = max_entries or int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES') or DEFAULT_MAX_ENTRIES)
+        self.dim = dim
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._load()
+
+    def _load(self):
+        rows = self._conn.execute("SELECT id, topic, vector, response FROM entries ORDER BY id").fetchall()
+        rows = [row for row in rows if len(row[2]) == self.dim * 4]
+        self._ids = [row[0] for row in rows]
+        self._topics = np.array([row[1] for row in rows], dtype=object)
+        self._responses = [row[3] for row in rows]
+        self._vectors = np.zeros((max(len(rows), 64), self.dim), dtype=np.float32)
+        for position, row in enumerate(rows):
+            self._vectors[position] = np.frombuffer(row[2], dtype=np.float32)
+        self._size = len(rows)
+        # Document frequency of every hashed term, kept up to date as entries come and go
+        self._doc_freq = (self._vectors[:self._size] > 0).sum(axis=0).astype(np.float64)
+
+    def _idf(self):
+        return np.log((1 + self._size) / (1 + self._doc_freq)) + 1
+
+    def lookup(self, topic, content, threshold=None):
+        """Return (response, similarity) of the most similar entry at or above the threshold, or None"""
+        threshold = self.threshold if threshold is None else threshold
+        started = time.perf_counter()
+        with REGISTRY.track('semantic_cache_lookup'):
+            query = term_frequencies(content, self.dim)
+            match = None
+            with self._lock:
+                candidates = np.flatnonzero(self._topics == topic) if self._size else []
+                if len(candidates) and query.any():
+                    # Cosine similarity under the current IDF weights, without rescaling the stored vectors
+                    idf = self._idf()
+                    vectors = self._vectors[candidates]
+                    dots = vectors @ (query * idf * idf)
+                    norms = np.sqrt((vectors * vectors) @ (idf * idf)) * np.linalg.norm(query * idf)
+                    similarities = np.divide(dots, norms, out=np.zeros_like(dots, dtype=np.float64),
+                                             where=norms > 0)
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= threshold:
+                        match = (self._responses[candidates[best]], float(similarities[best]))
+
+                self.lookup_seconds += time.perf_counter() - started
+                if match is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+        REGISTRY.inc('simplifier_semantic_cache_total', help_text="Semantic cache lookups",
+                      result='miss' if match is None else 'hit')
+        return match
+
+    def add(self, topic, content, response):
+        """Index a generated response, evicting the oldest entries past max_entries"""
+        vector = term_frequencies(content, self.dim)
+        if not vector.any():
+            return
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO entries (topic, vector, response, created_at) VALUES (?, ?, ?, ?)",
+                (topic, vector.tobytes(), response, time.time())
+            )
+            if self._size == len(self._vectors):
+                self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+            self._vectors[self._size] = vector
+            self._ids.append(cursor.lastrowid)
+            self._topics = np.append(self._topics, np.array([topic], dtype=object))
+            self._responses.append(response)
+            self._doc_freq += vector > 0
+            self._size += 1
+
+            # Evict in chunks so the matrix is not compacted on every insert
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self._evict(max(overflow, math.ceil(self.max_entries * 0.05)))
+
+    def _evict(self, count):
+        count = min(count, self._size)
+        self._conn.execute("DELETE FROM entries WHERE id <= ?", (self._ids[count - 1],))
+        self._doc_freq -= (self._vectors[:count] > 0).sum(axis=0)
+        self._vectors[:self._size - count] = self._vectors[count:self._size]
+        self._ids = self._ids[count:]
+        self._topics = self._topics[count:]
+        self._responses = self._responses[count:]
+        self._size -= count
+
+    def clear(self):
+        """Remove every entry and reset the counters"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._load()
+            self.hits = 0
+            self.misses = 0
+            self.lookup_seconds = 0.0
+
+    def stats(self):
+        """Hit rate, mean lookup latency and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'mean_lookup_ms': self.lookup_seconds / lookups * 1000 if lookups else 0.0,
+                'entries': self._size
+            }
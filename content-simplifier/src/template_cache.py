@@ -0,0 +1,110 @@
+import string
+import threading
+import time
+
+TEMPLATE_VARIABLES = ('level', 'subject', 'content')
+DEFAULT_TEMPLATE_TTL = 600
+
+
+class PromptRenderer:
+    """Pre-parsed prompt template that fills the {level}/{subject}/{content} variables"""
+
+    def __init__(self, template_text):
+        self.text = template_text
+        self.missing_variables = []
+
+        fields = []
+        segments = []
+        simple = True
+        for literal, field, format_spec, conversion in string.Formatter().parse(template_text):
+            segments.append((literal, field))
+            if field is not None:
+                fields.append(field)
+                if format_spec or conversion:
+                    simple = False
+
+        unknown = sorted(set(fields) - set(TEMPLATE_VARIABLES))
+        if unknown:
+            raise ValueError(f"Template uses unsupported variables: {', '.join(unknown)}")
+        if 'content' not in fields:
+            raise ValueError("Template is missing the required {content} variable")
+
+        self.missing_variables = [name for name in TEMPLATE_VARIABLES if name not in fields]
+        self._segments = segments if simple else None
+
+    def render(self, level, subject, content):
+        """Fill the template for one item"""
+        if self._segments is None:
+            return self.text.format(level=level, subject=subject, content=content)
+
+        values = {'level': level, 'subject': subject, 'content': content}
+        return "".join(
+            literal + (str(values[field]) if field is not None else "")
+            for literal, field in self._segments
+        )
+
+
+class TemplateCache:
+    """Process-wide prompt template cache keyed by asset ID with a TTL.
+
+    Templates are loaded outside the cache lock, so hits for other assets
+    never wait for a load, and concurrent misses for one asset load it once.
+    """
+
+    def __init__(self, ttl=DEFAULT_TEMPLATE_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+        # One lock per asset being loaded, and a count of refreshes so a load that overlaps one is not kept
+        self._load_locks = {}
+        self._refreshes = 0
+
+    def _fresh(self, asset_id):
+        entry = self._entries.get(asset_id)
+        if entry is not None and self._clock() - entry[1] < self.ttl:
+            return entry[0]
+        return None
+
+    def get(self, asset_id, loader):
+        """Return a renderer for asset_id, calling loader(asset_id) only on a miss or expiry"""
+        with self._lock:
+            renderer = self._fresh(asset_id)
+            if renderer is not None:
+                return renderer
+            load_lock = self._load_locks.setdefault(asset_id, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                # Another caller may have loaded it while this one waited
+                renderer = self._fresh(asset_id)
+                if renderer is not None:
+                    return renderer
+                refreshes = self._refreshes
+            try:
+                renderer = PromptRenderer(loader(asset_id))
+            except Exception:
+                with self._lock:
+                    self._load_locks.pop(asset_id, None)
+                raise
+
+            with self._lock:
+                if self._refreshes == refreshes:
+                    self._entries[asset_id] = (renderer, self._clock())
+                self._load_locks.pop(asset_id, None)
+            return renderer
+
+    def age(self, asset_id):
+        """Seconds since asset_id was loaded, or None if it is not cached"""
+        with self._lock:
+            entry = self._entries.get(asset_id)
+            return None if entry is None else self._clock() - entry[1]
+
+    def refresh(self, asset_id=None):
+        """Drop one cached template, or all of them, so the next get reloads it"""
+        with self._lock:
+            self._refreshes += 1
+            if asset_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(asset_id, None)
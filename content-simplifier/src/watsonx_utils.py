@@ -1,25 +1,340 @@
-from ibm_watsonx_ai import APIClient, Credentials
-from ibm_watsonx_ai.foundation_models import ModelInference
-from ibm_watsonx_ai.foundation_models.prompts import PromptTemplateManager
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
 
 
-def setup_watsonx(api_key, project_id, region):
-    """Setup Watsonx.ai client and model inference"""
+from backends import DEFAULT_SHORT_CONTENT_TOKENS, RoutedBackend, WatsonxBackend
+from batch_engine import run_batch
+from chunking import estimate_tokens
+from metrics import REGISTRY
+from response_cache import is_cacheable, make_cache_key
+from semantic_cache import make_topic_key
+
+DEFAULT_MODEL_ID = "ibm/granite-3-8b-instruct"
+DEFAULT_CLIENT_POOL_SIZE = 8
+DEFAULT_BLOCK_CONCURRENCY = 8
+
+_client_pool = OrderedDict()
+_client_pool_lock = threading.Lock()
+# One lock per client set being built, so one user's authentication does not hold up the others
+_client_build_locks = {}
+
+
+def client_pool_size():
+    """Client sets kept by get_shared_clients, read when used so a .env loaded after import applies"""
+    return int(os.getenv('WATSONX_CLIENT_POOL_SIZE') or DEFAULT_CLIENT_POOL_SIZE)
+
+
+def setup_watsonx(api_key, project_id, region, model_id=DEFAULT_MODEL_ID, short_model_id=None,
+                  max_short_tokens=DEFAULT_SHORT_CONTENT_TOKENS):
+    """Setup Watsonx.ai client and generation backend.
+
+    When short_model_id is given, content of up to max_short_tokens is routed
+    to that model and longer content to model_id.
+    """
+    # The SDK takes a noticeable share of a second to import, so it is only loaded
+    # once a session actually connects rather than on every cold start
+    from ibm_watsonx_ai import APIClient, Credentials
+    from ibm_watsonx_ai.foundation_models import ModelInference
+    from ibm_watsonx_ai.foundation_models.prompts import PromptTemplateManager
+
     url = f"https://{region}.ml.cloud.ibm.com"
     credentials = Credentials(api_key=api_key, url=url)
 
     client = APIClient(credentials)
     client.set.default_project(project_id)
 
-    model_inference = ModelInference(
-        model_id="ibm/granite-3-8b-instruct",
-        credentials=credentials,
-        project_id=project_id
-    )
+    # Reuse the client's IAM token and HTTP connection pool instead of authenticating again.
+    # The SDK's own retries are off so 429s reach the rate governor, which retries and backs off
+    backend = WatsonxBackend(ModelInference(
+        model_id=model_id,
+        api_client=client,
+        max_retries=0
+    ))
+    if short_model_id:
+        short_backend = WatsonxBackend(ModelInference(
+            model_id=short_model_id,
+            api_client=client,
+            max_retries=0
+        ))
+        backend = RoutedBackend(backend, short_backend, max_short_tokens)
 
     prompt_mgr = PromptTemplateManager(
-        credentials=credentials,
-        project_id=project_id
+        api_client=client
     )
 
-    return client, model_inference, prompt_mgr
\ No newline at end of file
+    return client, backend, prompt_mgr
+
+
+def get_shared_clients(api_key, project_id, region, model_id=DEFAULT_MODEL_ID, short_model_id=None,
+                       max_short_tokens=DEFAULT_SHORT_CONTENT_TOKENS):
+    """Return clients shared process-wide by every caller with the same settings.
+
+    At most WATSONX_CLIENT_POOL_SIZE (default 8) client sets are kept; the
+    least recently used is dropped when the pool is full. Clients are built
+    outside the pool lock, so callers whose clients are already pooled never
+    wait for another caller's authentication, and concurrent callers with the
+    same settings build them once.
+    """
+    key = (hashlib.sha256(api_key.encode('utf-8')).hexdigest(), project_id, region, model_id, short_model_id,
+           max_short_tokens)
+
+    with _client_pool_lock:
+        if key in _client_pool:
+            _client_pool.move_to_end(key)
+            return _client_pool[key]
+        build_lock = _client_build_locks.setdefault(key, threading.Lock())
+
+    with build_lock:
+        with _client_pool_lock:
+            # Another caller may have built them while this one waited
+            if key in _client_pool:
+                _client_pool.move_to_end(key)
+                return _client_pool[key]
+        try:
+            clients = setup_watsonx(api_key, project_id, region, model_id, short_model_id, max_short_tokens)
+        except Exception:
+            with _client_pool_lock:
+                _client_build_locks.pop(key, None)
+            raise
+
+        with _client_pool_lock:
+            _client_pool[key] = clients
+            _client_build_locks.pop(key, None)
+            while len(_client_pool) > client_pool_size():
+                _client_pool.popitem(last=False)
+        return clients
+
+
+def clear_shared_clients():
+    """Drop every pooled client set, forcing new connections on next use"""
+    with _client_pool_lock:
+        _client_pool.clear()
+
+
+def build_generation_params(max_tokens, temperature, decoding_method):
+    """Build generate_text params from the sidebar model settings"""
+    from ibm_watsonx_ai.metanames import GenTextParamsMetaNames as GenParams
+    from ibm_watsonx_ai.foundation_models.utils.enums import DecodingMethods
+
+    params = {
+        GenParams.MAX_NEW_TOKENS: max_tokens,
+        GenParams.TEMPERATURE: temperature
+    }
+
+    if decoding_method == 'greedy':
+        params[GenParams.DECODING_METHOD] = DecodingMethods.GREEDY
+    else:
+        params[GenParams.DECODING_METHOD] = DecodingMethods.SAMPLE
+
+    return params
+
+
+def load_template_text(prompt_mgr, prompt_template_id):
+    """Load a saved prompt template as a plain format string"""
+    from ibm_watsonx_ai.foundation_models.utils.enums import PromptTemplateFormats
+
+    with REGISTRY.track('load_template'):
+        return prompt_mgr.load_prompt(
+            prompt_id=prompt_template_id,
+            astype=PromptTemplateFormats.STRING
+        )
+
+
+def _lookup_cached(response_cache, cache_key):
+    cached = response_cache.get(cache_key)
+    REGISTRY.inc('simplifier_response_cache_total', help_text="Response cache lookups",
+                 result='miss' if cached is None else 'hit')
+    return cached
+
+
+def _lookup_similar(semantic_cache, renderer, level, subject, content, model_id, params):
+    """Return the request's semantic cache topic and a similar earlier response, or None"""
+    topic = make_topic_key(renderer.text, level, subject, model_id, params)
+    match = semantic_cache.lookup(topic, content)
+    return topic, None if match is None else match[0]
+
+
+def _token_budget(prompt, params):
+    # Prompt tokens plus the most the model may generate, for tokens-per-minute limits
+    return estimate_tokens(prompt) + int(params.get('max_new_tokens', 0))
+
+
+def simplify_content(backend, renderer, level, subject, content, params, response_cache=None,
+                     governor=None, semantic_cache=None):
+    """Fill the template and generate, consulting the response cache for deterministic params.
+
+    When a RateGovernor is given the call is rate limited and retried on
+    throttling and transient errors. When a SemanticCache is given, a response
+    to similarly worded content is reused after an exact cache miss.
+    """
+    backend = backend.select(content)
+    cache_key = None
+    if response_cache is not None and is_cacheable(params):
+        cache_key = make_cache_key(renderer.text, level, subject, content, backend.model_id, params)
+        cached = _lookup_cached(response_cache, cache_key)
+        if cached is not None:
+            return cached
+
+    topic = None
+    if semantic_cache is not None and is_cacheable(params):
+        topic, similar = _lookup_similar(semantic_cache, renderer, level, subject, content, backend.model_id, params)
+        if similar is not None:
+            return similar
+
+    prompt = renderer.render(level, subject, content)
+
+    def generate():
+        with REGISTRY.track('generate_text'):
+            return backend.generate(prompt, params)
+
+    if governor is not None:
+        response = governor.call(generate, tokens=_token_budget(prompt, params))
+    else:
+        response = generate()
+    REGISTRY.record_tokens('generate_text', estimate_tokens(prompt), estimate_tokens(response))
+
+    if cache_key is not None:
+        response_cache.put(cache_key, response)
+    if topic is not None:
+        semantic_cache.add(topic, content, response)
+    return response
+
+
+def _generate_block(backend, renderer, rows, params, governor, concurrency_limit):
+    prompts = [renderer.render(row['level'], row['subject'], row['content']) for row in rows]
+    try:
+        # The block is attempted once; retries happen per row in the fallback below.
+        # It holds one governor slot per request it has in flight, so block mode stays
+        # within the adaptive concurrency limit and the batch share
+        in_flight = max(1, min(concurrency_limit, len(prompts)))
+        limit = nullcontext(in_flight) if governor is None else governor.limit(
+            sum(_token_budget(prompt, params) for prompt in prompts), requests=len(prompts), slots=in_flight
+        )
+        with limit as granted, REGISTRY.track('generate_text_block'):
+            responses = backend.generate_batch(prompts, params, concurrency_limit=granted)
+    except Exception:
+        def simplify_row(row):
+            return simplify_content(backend, renderer, row['level'], row['subject'], row['content'],
+                                    params, governor=governor)
+
+        outcomes = run_batch(rows, simplify_row, max_workers=concurrency_limit)
+        return [outcome.result if outcome.ok else outcome.error for outcome in outcomes]
+
+    for prompt, response in zip(prompts, responses):
+        REGISTRY.record_tokens('generate_text_block', estimate_tokens(prompt), estimate_tokens(response))
+    return responses
+
+
+def simplify_block(backend, renderer, rows, params, response_cache=None, governor=None,
+                   concurrency_limit=DEFAULT_BLOCK_CONCURRENCY, semantic_cache=None):
+    """Generate a block of rows with one multi-prompt call per model the rows are routed to.
+
+    Returns one entry per row: the response, or the exception the row failed
+    with. Cached rows, and rows with a similar entry in semantic_cache, are
+    not sent. If a multi-prompt call fails, its rows are generated one by one
+    (with the governor's retries) so a single bad row does not fail the whole
+    block.
+    """
+    results = [None] * len(rows)
+    cache_keys = [None] * len(rows)
+    topics = [None] * len(rows)
+    pending = {}
+    for position, row in enumerate(rows):
+        row_backend = backend.select(row['content'])
+        if response_cache is not None and is_cacheable(params):
+            cache_keys[position] = make_cache_key(renderer.text, row['level'], row['subject'], row['content'],
+                                                  row_backend.model_id, params)
+            cached = _lookup_cached(response_cache, cache_keys[position])
+            if cached is not None:
+                results[position] = cached
+                continue
+        if semantic_cache is not None and is_cacheable(params):
+            topics[position], similar = _lookup_similar(semantic_cache, renderer, row['level'], row['subject'],
+                                                        row['content'], row_backend.model_id, params)
+            if similar is not None:
+                results[position] = similar
+                continue
+        pending.setdefault(row_backend, []).append(position)
+
+    def generate_group(group):
+        row_backend, positions = group
+        return _generate_block(row_backend, renderer, [rows[position] for position in positions], params,
+                               governor, concurrency_limit)
+
+    groups = list(pending.items())
+    if len(groups) > 1:
+        # Rows routed to different models are sent to each of them at the same time
+        group_responses = [outcome.result for outcome in run_batch(groups, generate_group, max_workers=len(groups))]
+    else:
+        group_responses = [generate_group(group) for group in groups]
+
+    for (_, positions), responses in zip(groups, group_responses):
+        for position, response in zip(positions, responses):
+            if cache_keys[position] is not None and not isinstance(response, Exception):
+                response_cache.put(cache_keys[position], response)
+            if topics[position] is not None and not isinstance(response, Exception):
+                semantic_cache.add(topics[position], rows[position]['content'], response)
+            results[position] = response
+    return results
+
+
+def stream_simplified_content(backend, renderer, level, subject, content, params,
+                              response_cache=None, on_text=None, governor=None, semantic_cache=None):
+    """Stream a generation, calling on_text(text_so_far) as chunks arrive.
+
+    Returns the final response together with time-to-first-token and total
+    latency in seconds.
+    """
+    started = time.perf_counter()
+    backend = backend.select(content)
+    cache_key = None
+    if response_cache is not None and is_cacheable(params):
+        cache_key = make_cache_key(renderer.text, level, subject, content, backend.model_id, params)
+        cached = _lookup_cached(response_cache, cache_key)
+        if cached is not None:
+            elapsed = time.perf_counter() - started
+            if on_text is not None:
+                on_text(cached)
+            return cached, {'ttft_s': elapsed, 'latency_s': elapsed}
+
+    topic = None
+    if semantic_cache is not None and is_cacheable(params):
+        topic, similar = _lookup_similar(semantic_cache, renderer, level, subject, content, backend.model_id, params)
+        if similar is not None:
+            elapsed = time.perf_counter() - started
+            if on_text is not None:
+                on_text(similar)
+            return similar, {'ttft_s': elapsed, 'latency_s': elapsed}
+
+    prompt = renderer.render(level, subject, content)
+    chunks = []
+    first_token_at = None
+    # Streams are rate limited but not retried, since chunks may already be on screen
+    limit = governor.limit(_token_budget(prompt, params)) if governor is not None else nullcontext()
+    with limit, REGISTRY.track('generate_text_stream'):
+        for chunk in backend.stream(prompt, params):
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            chunks.append(chunk)
+            if on_text is not None:
+                on_text("".join(chunks))
+
+    finished = time.perf_counter()
+    response = "".join(chunks)
+    REGISTRY.record_tokens('generate_text_stream', estimate_tokens(prompt), estimate_tokens(response))
+    if first_token_at is not None:
+        REGISTRY.observe('simplifier_time_to_first_token_seconds', first_token_at - started,
+                         help_text="Time until the first streamed chunk", operation='generate_text_stream')
+    if cache_key is not None:
+        response_cache.put(cache_key, response)
+    if topic is not None:
+        semantic_cache.add(topic, content, response)
+
+    return response, {
+        'ttft_s': (first_token_at or finished) - started,
+        'latency_s': finished - started
+    }